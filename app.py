@@ -1,11 +1,31 @@
 import os
 import csv
+import atexit
+import json
+import time
+import uuid
+import heapq
+import hashlib
 import random
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import altair as alt
 import streamlit as st
 
+from storage import (
+    ANS_HEADERS, ARCHIVED_STATUSES, EPOCH_RETENTION, LEGACY_EPOCH, PROGRESS_HEADERS, REVIEW_MODE, SCORES_HEADERS,
+    CsvTailIndex,
+    answers_file, append_csv_rows, atomic_write_csv, csv_lines, current_epoch, daemon_request, ensure_csv,
+    file_lock, file_size, gc_epochs, list_epochs, progress_archive_file, progress_file, rewrite_append_log,
+    scores_file, sessions_dir, start_new_epoch, atomic_write_json,
+)
+
 
 # =========================
 # CONFIG
@@ -31,51 +51,214 @@ ADMIN_USER, ADMIN_PASS = get_admin_credentials()
 
 
 # =========================
-# STORAGE (CSV)
+# METRICS (Prometheus)
 # =========================
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+# Exportação opcional: arquivo texto (BOOLEAN_METRICS_FILE) e/ou endpoint HTTP local (BOOLEAN_METRICS_PORT).
+# Taxas (respostas/s, upserts/s...) saem de rate() sobre os contadores no Prometheus.
+# Cada processo do Streamlit exporta o próprio registro, com label pid: arquivo próprio (boolean.prom ->
+# boolean.<pid>.prom, ou "{pid}" no nome) e a primeira porta livre entre PORT e PORT + PORT_SPAN - 1.
+# Some por processo no PromQL: sum without (pid) (rate(...)).
+METRICS_FILE = os.getenv("BOOLEAN_METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("BOOLEAN_METRICS_PORT", "0") or 0)
+METRICS_PORT_SPAN = int(os.getenv("BOOLEAN_METRICS_PORT_SPAN", "16"))
+METRICS_FLUSH_SECONDS = float(os.getenv("BOOLEAN_METRICS_FLUSH_SECONDS", "15"))
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+
+METRIC_HELP = {
+    "boolean_storage_ops_total": ("counter", "Operações de escrita por tipo (answer, score, progress_upsert...)."),
+    "boolean_storage_bytes_written_total": ("counter", "Bytes escritos por arquivo de dados."),
+    "boolean_storage_write_seconds": ("histogram", "Latência das escritas em disco."),
+    "boolean_admin_render_seconds": ("histogram", "Tempo de renderização da área do administrador."),
+    "boolean_data_file_bytes": ("gauge", "Tamanho atual de cada arquivo de dados."),
+    "boolean_active_sessions": ("gauge", "Alunos com status IN_PROGRESS."),
+    "boolean_duplicate_answers_total": ("counter", "Respostas reenviadas descartadas antes da escrita."),
+    "boolean_expired_sessions_total": ("counter", "Sessões encerradas por inatividade ou fim do prazo da prova."),
+}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> valor
+        self.gauges = {}        # (name, labels) -> valor
+        self.histograms = {}    # (name, labels) -> [contagens por bucket, soma, total]
+        self.gauge_callbacks = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def render(self) -> str:
+        for callback in self.gauge_callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pass
 
-SCORES_FILE = DATA_DIR / "boolean_scores.csv"          # finalizados
-ANSWERS_FILE = DATA_DIR / "boolean_answers.csv"        # log por questão
-PROGRESS_FILE = DATA_DIR / "boolean_progress.csv"      # andamento
+        def fmt(labels, extra=()):
+            items = [("pid", os.getpid())] + list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        by_name = {}
+        with self.lock:
+            for (name, labels), v in self.counters.items():
+                by_name.setdefault(name, []).append(f"{name}{fmt(labels)} {v}")
+            for (name, labels), v in self.gauges.items():
+                by_name.setdefault(name, []).append(f"{name}{fmt(labels)} {v}")
+            for (name, labels), (buckets, total_sum, count) in self.histograms.items():
+                lines = by_name.setdefault(name, [])
+                for bound, c in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {c}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{fmt(labels)} {total_sum}")
+                lines.append(f"{name}_count{fmt(labels)} {count}")
+
+        out = []
+        for name in sorted(by_name):
+            kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(by_name[name])
+        return "\n".join(out) + "\n"
+
+
+def metrics_file_path() -> Path:
+    if "{pid}" in METRICS_FILE:
+        return Path(METRICS_FILE.replace("{pid}", str(os.getpid())))
+    path = Path(METRICS_FILE)
+    return path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+
+
+def write_metrics_file(registry: MetricsRegistry, path: Path):
+    tmp = path.with_name(f".{path.name}.tmp")  # fora do glob *.prom do coletor
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def start_metrics_exporters(registry: MetricsRegistry):
+    if METRICS_PORT:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
 
-SCORES_HEADERS = [
-    "timestamp_utc", "student_name",
-    "base_correct", "final_points",
-    "total", "percent_official", "max_streak"
-]
-ANS_HEADERS = ["timestamp_utc", "student_name", "question_id", "level", "is_correct"]
-PROGRESS_HEADERS = [
-    "timestamp_utc", "student_name",
-    "q_index", "total",
-    "base_correct", "final_points", "percent_official_live",
-    "streak", "max_streak", "status"
-]
+        for port in range(METRICS_PORT, METRICS_PORT + max(1, METRICS_PORT_SPAN)):
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+            except OSError:
+                continue  # porta de outro processo do app
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            break
+
+    if METRICS_FILE:
+        path = metrics_file_path()
+
+        def loop():
+            while True:
+                try:
+                    write_metrics_file(registry, path)
+                except OSError:
+                    pass
+                time.sleep(METRICS_FLUSH_SECONDS)
+
+        def remove_file():
+            try:
+                os.unlink(path)  # contadores de processo encerrado não ficam no coletor
+            except OSError:
+                pass
+
+        atexit.register(remove_file)
+        threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+
+
+@st.cache_resource
+def get_metrics() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    start_metrics_exporters(registry)
+    return registry
 
 
+def record_write(op: str, path: Path, seconds: float, written: int = None):
+    """`written`: bytes deste processo; None numa reescrita, que grava o arquivo inteiro."""
+    metrics = get_metrics()
+    metrics.observe("boolean_storage_write_seconds", seconds, op=op)
+    metrics.inc("boolean_storage_ops_total", op=op)
+    metrics.inc("boolean_storage_bytes_written_total", file_size(path) if written is None else written,
+                file=path.name)
+
+
+@contextmanager
+def track_write(op: str, path: Path, written: int = None):
+    """
+    Mede uma escrita: contador da operação, bytes gravados e latência.
+    Appends informam o tamanho do próprio lote: a diferença de tamanho do arquivo incluiria linhas
+    de outros processos (e, com o daemon, de todo o group commit).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_write(op, path, time.perf_counter() - start, written)
+
+
+def daemon_write(op: str, path: Path, payload: dict):
+    """Pedido de escrita ao daemon; só entra nas métricas se o daemon atendeu (senão quem chama escreve direto)."""
+    start = time.perf_counter()
+    response = daemon_request(payload)
+    if response is not None:
+        record_write(op, path, time.perf_counter() - start)
+        if "active" in response:
+            get_metrics().set("boolean_active_sessions", response["active"])
+    return response
+
+
+# =========================
+# STORAGE (CSV)
+# =========================
 def ensure_file(path: Path, headers: list[str]):
-    if not path.exists():
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(headers)
+    ensure_csv(path, headers)
 
 
 def ensure_scores_file():
-    ensure_file(SCORES_FILE, SCORES_HEADERS)
+    ensure_file(scores_file(), SCORES_HEADERS)
 
 
 def ensure_answers_file():
-    ensure_file(ANSWERS_FILE, ANS_HEADERS)
+    ensure_file(answers_file(), ANS_HEADERS)
 
 
 def ensure_progress_file():
-    ensure_file(PROGRESS_FILE, PROGRESS_HEADERS)
+    ensure_file(progress_file(), PROGRESS_HEADERS)
 
 
 def load_scores():
     ensure_scores_file()
     rows = []
-    with open(SCORES_FILE, "r", newline="", encoding="utf-8") as f:
+    with open(scores_file(), "r", newline="", encoding="utf-8") as f:
         for row in csv.DictReader(f):
             try:
                 row["base_correct"] = int(row.get("base_correct", 0))
@@ -92,7 +275,7 @@ def load_scores():
 def load_answers():
     ensure_answers_file()
     rows = []
-    with open(ANSWERS_FILE, "r", newline="", encoding="utf-8") as f:
+    with open(answers_file(), "r", newline="", encoding="utf-8") as f:
         for row in csv.DictReader(f):
             try:
                 row["is_correct"] = int(row.get("is_correct", 0))
@@ -105,7 +288,7 @@ def load_answers():
 def load_progress():
     ensure_progress_file()
     rows = []
-    with open(PROGRESS_FILE, "r", newline="", encoding="utf-8") as f:
+    with open(progress_file(), "r", newline="", encoding="utf-8") as f:
         for row in csv.DictReader(f):
             try:
                 row["q_index"] = int(row.get("q_index", 0))
@@ -121,72 +304,604 @@ def load_progress():
     return rows
 
 
-def append_score(student_name: str, base_correct: int, final_points: int, total: int, max_streak: int):
-    ensure_scores_file()
+def append_rows(op: str, path: Path, headers: list[str], rows: list[list]):
+    """
+    Append pelo daemon de armazenamento (group commit) quando ele está no ar; senão, direto no arquivo.
+    """
+    with track_write(op, path, written=len(csv_lines(rows))):
+        payload = {"op": "append", "path": str(path.resolve()), "headers": headers, "rows": rows}
+        if daemon_request(payload) is None:
+            ensure_file(path, headers)
+            append_csv_rows(path, rows)
+
+
+def append_score(student_name: str, base_correct: int, final_points: int, total: int, max_streak: int,
+                 bank_version: str = ""):
     percent_official = (base_correct / total) * 100 if total else 0.0
     ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    with open(SCORES_FILE, "a", newline="", encoding="utf-8") as f:
-        csv.writer(f).writerow([ts, student_name, base_correct, final_points, total, f"{percent_official:.2f}", max_streak])
+    append_rows("score", scores_file(), SCORES_HEADERS,
+                [[ts, student_name, base_correct, final_points, total, f"{percent_official:.2f}", max_streak, bank_version]])
+    get_score_index().refresh()
 
 
-def append_answer(student_name: str, question_id: str, level: str, is_correct: bool):
-    ensure_answers_file()
+def append_answer(student_name: str, question_id: str, level: str, is_correct: bool, bank_version: str = "",
+                  attempt_id: str = "", mode: str = "quiz") -> bool:
+    """
+    Grava a resposta uma única vez por (aluno, tentativa, questão). Retorna False para reenvios
+    (duplo clique, rerun após reconexão), descartados antes de qualquer I/O.
+    Respostas do modo revisão (mode=REVIEW_MODE) ficam fora das estatísticas da turma.
+    """
+    key = answer_key(student_name, attempt_id, question_id)
+    if attempt_id and not get_recent_answer_keys().claim(key):
+        get_metrics().inc("boolean_duplicate_answers_total")
+        return False
     ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-    with open(ANSWERS_FILE, "a", newline="", encoding="utf-8") as f:
-        csv.writer(f).writerow([ts, student_name, question_id, level, int(is_correct)])
+    try:
+        append_rows("answer", answers_file(), ANS_HEADERS,
+                    [[ts, student_name, question_id, level, int(is_correct), bank_version, attempt_id, mode]])
+    except Exception:
+        if attempt_id:
+            get_recent_answer_keys().release(key)  # LockTimeout etc.: a resposta não foi gravada
+        raise
+    get_accuracy_series().refresh()
+    get_wrong_answer_index().refresh()
+    return True
+
+
+def dedupe_answers() -> int:
+    """Limpa o log existente: mantém a primeira resposta de cada (aluno, tentativa, questão)."""
+    def first_only(rows: list[dict]) -> list[dict]:
+        seen = set()
+        kept = []
+        for r in rows:
+            if r.get("attempt_id"):
+                key = answer_key(r.get("student_name", ""), r["attempt_id"], r.get("question_id", ""))
+            else:  # linhas antigas, sem tentativa: só duplicata exata de horário
+                key = (r.get("timestamp_utc"), (r.get("student_name") or "").strip().lower(), r.get("question_id"))
+            if key not in seen:
+                seen.add(key)
+                kept.append(r)
+        return kept
+
+    path = answers_file()
+    ensure_file(path, ANS_HEADERS)
+    with track_write("answers_dedupe", path):
+        return rewrite_append_log(path, ANS_HEADERS, first_only)
+
+
+def answer_level_stats() -> dict:
+    """
+    Acertos/total por versão do banco e dificuldade. Usa o agregado em cache do daemon quando disponível.
+    """
+    response = daemon_request({"op": "answer_stats", "path": str(answers_file().resolve())})
+    if response is not None:
+        return response["stats"]
+
+    stats = {}
+    for a in load_answers():
+        if a.get("mode") == REVIEW_MODE:
+            continue
+        level_stats = stats.setdefault(a.get("bank_version") or "", {})
+        counts = level_stats.setdefault(a.get("level", "Médio"), {"correct": 0, "total": 0})
+        counts["total"] += 1
+        counts["correct"] += 1 if a["is_correct"] == 1 else 0
+    return stats
+
+
+def progress_row(ts: str, student_name: str, q_index: int, total: int, base_correct: int, final_points: int,
+                 percent_official_live: float, streak: int, max_streak: int, status: str) -> dict:
+    return {
+        "timestamp_utc": ts,
+        "student_name": student_name,
+        "q_index": str(q_index),
+        "total": str(total),
+        "base_correct": str(base_correct),
+        "final_points": str(final_points),
+        "percent_official_live": f"{percent_official_live:.2f}",
+        "streak": str(streak),
+        "max_streak": str(max_streak),
+        "status": status
+    }
 
 
-def upsert_progress(student_name: str, q_index: int, total: int, base_correct: int, final_points: int,
-                    percent_official_live: float, streak: int, max_streak: int, status: str):
-    ensure_progress_file()
-    ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+def read_progress_rows(path: Path) -> list[dict]:
+    ensure_file(path, PROGRESS_HEADERS)
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
 
-    rows = []
-    found = False
-    with open(PROGRESS_FILE, "r", newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
+
+def write_progress_rows(path: Path, rows: list[dict], op: str = "progress_upsert"):
+    # quem chama segura file_lock(path) durante o read-modify-write
+    with track_write(op, path):
+        atomic_write_csv(path, PROGRESS_HEADERS, rows)
+    get_metrics().set("boolean_active_sessions", sum(1 for r in rows if r.get("status") == "IN_PROGRESS"))
+
+
+def append_progress_archive(rows: list[dict], epoch: str = None):
+    if not rows:
+        return
+    append_rows("progress_archive_append", progress_archive_file(epoch), PROGRESS_HEADERS,
+                [[r.get(h, "") for h in PROGRESS_HEADERS] for r in rows])
+
+
+def upsert_progress(student_name: str, q_index: int, total: int, base_correct: int, final_points: int,
+                    percent_official_live: float, streak: int, max_streak: int, status: str,
+                    deadline: float = None):
+    now = datetime.now(timezone.utc)
+    ts = now.strftime("%Y-%m-%d %H:%M:%S")
+    new_row = progress_row(ts, student_name, q_index, total, base_correct, final_points,
+                           percent_official_live, streak, max_streak, status)
+    path = progress_file()
+    get_session_expiry().touch(student_name, now.timestamp(), deadline)
+
+    if daemon_write("progress_upsert", path, {"op": "upsert_progress", "path": str(path.resolve()),
+                                              "headers": PROGRESS_HEADERS, "row": new_row}) is not None:
+        return
+
+    with file_lock(path):
+        rows = []
+        found = False
+        for r in read_progress_rows(path):
             if (r.get("student_name") or "").strip().lower() == student_name.strip().lower():
-                r = {
-                    "timestamp_utc": ts,
-                    "student_name": student_name,
-                    "q_index": str(q_index),
-                    "total": str(total),
-                    "base_correct": str(base_correct),
-                    "final_points": str(final_points),
-                    "percent_official_live": f"{percent_official_live:.2f}",
-                    "streak": str(streak),
-                    "max_streak": str(max_streak),
-                    "status": status
-                }
+                r = new_row
                 found = True
             rows.append(r)
 
-    if not found:
-        rows.append({
-            "timestamp_utc": ts,
-            "student_name": student_name,
-            "q_index": str(q_index),
-            "total": str(total),
-            "base_correct": str(base_correct),
-            "final_points": str(final_points),
-            "percent_official_live": f"{percent_official_live:.2f}",
-            "streak": str(streak),
-            "max_streak": str(max_streak),
-            "status": status
-        })
-
-    with open(PROGRESS_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=PROGRESS_HEADERS)
-        writer.writeheader()
-        writer.writerows(rows)
-
-
-def clear_all_data():
-    for p, h in [(SCORES_FILE, SCORES_HEADERS), (ANSWERS_FILE, ANS_HEADERS), (PROGRESS_FILE, PROGRESS_HEADERS)]:
-        if p.exists():
-            p.unlink()
-        ensure_file(p, h)
+        if not found:
+            rows.append(new_row)
+
+        write_progress_rows(path, rows)
+
+
+def archive_progress(student_name: str, q_index: int, total: int, base_correct: int, final_points: int,
+                     percent_official_live: float, streak: int, max_streak: int, status: str):
+    """
+    Encerra a sessão: grava a linha final no arquivo morto e tira o aluno do andamento.
+    """
+    ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    epoch = current_epoch()
+    path = progress_file(epoch)
+    get_session_expiry().forget(student_name)
+    append_progress_archive([progress_row(ts, student_name, q_index, total, base_correct, final_points,
+                                          percent_official_live, streak, max_streak, status)], epoch)
+
+    if daemon_write("progress_archive", path, {"op": "remove_progress", "path": str(path.resolve()),
+                                               "headers": PROGRESS_HEADERS, "student_name": student_name}) is not None:
+        return
+
+    key = student_name.strip().lower()
+    with file_lock(path):
+        rows = read_progress_rows(path)
+        kept = [r for r in rows if (r.get("student_name") or "").strip().lower() != key]
+        if len(kept) != len(rows):
+            write_progress_rows(path, kept, op="progress_archive")
+
+
+def sweep_progress_archive() -> int:
+    """
+    Varredura periódica: move para o arquivo morto as linhas encerradas que ficaram no andamento.
+    """
+    epoch = current_epoch()
+    path = progress_file(epoch)
+    with file_lock(path):
+        rows = read_progress_rows(path)
+        done = [r for r in rows if r.get("status") in ARCHIVED_STATUSES]
+        if done:
+            append_progress_archive(done, epoch)
+            write_progress_rows(path, [r for r in rows if r.get("status") not in ARCHIVED_STATUSES], op="progress_sweep")
+    return len(done)
+
+
+def student_hash(student_name: str) -> str:
+    return hashlib.sha1(student_name.strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+SNAPSHOT_KEY_RE = re.compile(r"[0-9a-f]{16}")
+
+
+def snapshot_file(key: str) -> Path:
+    if not SNAPSHOT_KEY_RE.fullmatch(key):
+        raise ValueError(f"chave de snapshot inválida: {key!r}")  # nunca sai do diretório de sessões
+    return sessions_dir() / f"{key}.json"
+
+
+def write_snapshot(snapshot: dict):
+    """Estado compacto da tentativa (semente da ordem + contadores), para retomar sem refazer nada."""
+    path = snapshot_file(student_hash(snapshot["student_name"]))
+    with track_write("session_snapshot", path):
+        atomic_write_json(path, snapshot)
+
+
+def load_snapshot(key: str):
+    try:
+        with open(snapshot_file(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def delete_snapshot(student_name: str):
+    try:
+        os.unlink(snapshot_file(student_hash(student_name)))
+    except OSError:
+        pass
+
+
+def clear_all_data() -> str:
+    """
+    "Limpar" = começar uma época nova (O(1)); os dados anteriores ficam disponíveis para exportação
+    até a retenção apagá-los.
+    """
+    epoch = start_new_epoch()
+    gc_epochs()
+    return epoch
+
+
+# =========================
+# EXPIRAÇÃO DE SESSÕES
+# =========================
+# Sessões sem atividade há mais de BOOLEAN_IDLE_TIMEOUT_MIN minutos (0 desliga) viram ABANDONED e saem do
+# andamento. Com BOOLEAN_EXAM_MINUTES (0 = sem prova cronometrada), cada tentativa tem prazo: o aluno vê o
+# tempo restante e o quiz termina sozinho; quem fechou a aba é encerrado pelo mesmo agendador.
+IDLE_TIMEOUT_MIN = float(os.getenv("BOOLEAN_IDLE_TIMEOUT_MIN", "30"))
+EXAM_MINUTES = float(os.getenv("BOOLEAN_EXAM_MINUTES", "0"))
+EXAM_GRACE_SECONDS = 120    # folga para a própria tela do aluno encerrar a prova antes do agendador
+EXPIRY_MAX_WAIT_SECONDS = 60
+EXPIRY_RETRY_SECONDS = 5    # nova tentativa quando a expiração falha (trava ocupada etc.)
+
+
+def parse_utc(ts: str) -> float:
+    return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+class SessionExpiry:
+    """
+    Agendador de prazos em min-heap: (vencimento, aluno). Atividade nova só empurra uma entrada (O(log n));
+    entradas vencidas que não batem mais com o prazo atual do aluno são descartadas ao sair do heap.
+    O arquivo de andamento só é lido quando algo vence, e cada linha é conferida de novo sob a trava
+    (outro worker pode ter gravado atividade mais recente).
+    """
+
+    def __init__(self, idle_seconds: float):
+        self.idle_seconds = idle_seconds
+        self.cond = threading.Condition()
+        self.heap = []
+        self.idle_due = {}      # nome normalizado -> vencimento por inatividade
+        self.deadlines = {}     # nome normalizado -> prazo da prova (+ folga)
+
+    def push(self, due: float, key: str):
+        heapq.heappush(self.heap, (due, key))
+        self.cond.notify()
+
+    def touch(self, student_name: str, last_activity: float, deadline: float = None):
+        key = student_name.strip().lower()
+        with self.cond:
+            if self.idle_seconds > 0:
+                self.idle_due[key] = last_activity + self.idle_seconds
+                self.push(self.idle_due[key], key)
+            if deadline and self.deadlines.get(key) != deadline + EXAM_GRACE_SECONDS:
+                self.deadlines[key] = deadline + EXAM_GRACE_SECONDS
+                self.push(self.deadlines[key], key)
+
+    def forget(self, student_name: str):
+        key = student_name.strip().lower()
+        with self.cond:
+            self.idle_due.pop(key, None)
+            self.deadlines.pop(key, None)
+
+    def seed(self, path: Path):
+        for r in read_progress_rows(path):
+            if r.get("status") != "IN_PROGRESS":
+                continue
+            try:
+                self.touch(r["student_name"], parse_utc(r["timestamp_utc"]))
+            except (KeyError, ValueError):
+                continue
+
+    def pop_due(self, now: float) -> dict:
+        """Alunos vencidos -> True se o prazo da prova venceu (senão, só inatividade)."""
+        due = {}
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                at, key = heapq.heappop(self.heap)
+                if self.deadlines.get(key) == at:
+                    due[key] = True
+                elif self.idle_due.get(key) == at:
+                    due.setdefault(key, False)
+                # senão: entrada velha (houve atividade depois), descartada
+        return due
+
+    def retry(self, due: dict, at: float):
+        """Devolve ao heap os alunos já retirados por pop_due, para nova tentativa em `at`."""
+        with self.cond:
+            for key, is_deadline in due.items():
+                schedule = self.deadlines if is_deadline else self.idle_due
+                if key in schedule:
+                    schedule[key] = at
+                    self.push(at, key)
+
+    def expire(self, due: dict, now: float) -> int:
+        epoch = current_epoch()
+        path = progress_file(epoch)
+        ts = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with file_lock(path):
+            rows = read_progress_rows(path)
+            kept, expired, rescheduled = [], [], set()
+            for r in rows:
+                key = (r.get("student_name") or "").strip().lower()
+                if key not in due or r.get("status") != "IN_PROGRESS":
+                    kept.append(r)
+                    continue
+                try:
+                    last_activity = parse_utc(r["timestamp_utc"])
+                except (KeyError, ValueError):
+                    last_activity = 0.0
+                if not due[key] and last_activity + self.idle_seconds > now:
+                    # atividade mais recente (outro worker): reagenda pelo horário do arquivo
+                    self.touch(r["student_name"], last_activity)
+                    rescheduled.add(key)
+                    kept.append(r)
+                    continue
+                expired.append({**r, "timestamp_utc": ts, "status": "ABANDONED"})
+            if expired:
+                append_progress_archive(expired, epoch)
+                write_progress_rows(path, kept, op="progress_expire")
+        for key in set(due) - rescheduled:
+            self.forget(key)
+        return len(expired)
+
+    def run(self):
+        while True:
+            with self.cond:
+                wait = self.heap[0][0] - time.time() if self.heap else EXPIRY_MAX_WAIT_SECONDS
+                if wait > 0:
+                    self.cond.wait(min(wait, EXPIRY_MAX_WAIT_SECONDS))
+            now = time.time()
+            due = self.pop_due(now)
+            if not due:
+                continue
+            try:
+                get_metrics().inc("boolean_expired_sessions_total", self.expire(due, now))
+            except Exception:
+                # trava ocupada etc.: as entradas já saíram do heap, então são reagendadas aqui
+                self.retry(due, time.time() + EXPIRY_RETRY_SECONDS)
+
+
+@st.cache_resource
+def get_session_expiry() -> SessionExpiry:
+    expiry = SessionExpiry(IDLE_TIMEOUT_MIN * 60)
+    expiry.seed(progress_file())
+    threading.Thread(target=expiry.run, name="session-expiry", daemon=True).start()
+    return expiry
+
+
+# =========================
+# ÍNDICES INCREMENTAIS
+# =========================
+class FenwickTree:
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def add(self, i: int, delta: int):
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Soma das posições 0..i (inclusive)."""
+        i = min(i + 1, len(self.tree) - 1)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class ScorePercentileIndex(CsvTailIndex):
+    """Melhor % oficial de cada aluno numa Fenwick tree: a comparação é com a turma, não com tentativas."""
+    # % oficial com 2 casas -> baldes de 0.01 entre 0 e 100
+    BUCKETS = 10001
+
+    def reset(self):
+        self.tree = FenwickTree(self.BUCKETS)
+        self.best = {}  # nome normalizado -> balde da melhor tentativa
+
+    def bucket(self, percent: float) -> int:
+        return min(self.BUCKETS - 1, max(0, round(percent * 100)))
+
+    def add(self, row: dict):
+        key = row["student_name"].strip().lower()
+        b = self.bucket(float(row["percent_official"]))
+        old = self.best.get(key)
+        if old is not None and old >= b:
+            return
+        if old is not None:
+            self.tree.add(old, -1)
+        self.tree.add(b, 1)
+        self.best[key] = b
+
+    def better_than(self, student_name: str, percent: float):
+        """
+        % dos outros alunos (melhor tentativa de cada um) com % oficial menor que `percent`
+        (None se não há com quem comparar).
+        """
+        self.refresh()
+        own = self.best.get(student_name.strip().lower())
+        others = len(self.best) - (own is not None)
+        if others <= 0:
+            return None
+        b = self.bucket(percent)
+        below = self.tree.prefix(b - 1) - (own is not None and own < b)
+        return (below / others) * 100
+
+
+@st.cache_resource
+def get_score_index() -> ScorePercentileIndex:
+    return ScorePercentileIndex(scores_file)
+
+
+# resolução -> (segundos por balde, baldes guardados); memória fixa por resolução
+SERIES_RESOLUTIONS = {
+    "Minuto": (60, 120),
+    "Hora": (3600, 48),
+    "Dia": (86400, 60),
+}
+
+
+class RingBuckets:
+    """
+    Buffer circular de baldes de tempo: o balde `n` ocupa a posição n % slots e é zerado
+    quando um balde mais novo reaproveita a posição.
+    """
+
+    def __init__(self, seconds: int, slots: int):
+        self.seconds = seconds
+        self.slots = slots
+        self.ids = [-1] * slots
+        self.levels = [{} for _ in range(slots)]       # nível -> [acertos, total]
+        self.questions = [{} for _ in range(slots)]    # questão -> [acertos, total]
+        self.newest = -1
+
+    def add(self, epoch_seconds: int, level: str, qid: str, correct: int):
+        bucket = epoch_seconds // self.seconds
+        if bucket <= self.newest - self.slots:
+            return  # mais antigo que a janela guardada
+        self.newest = max(self.newest, bucket)
+        i = bucket % self.slots
+        if self.ids[i] != bucket:
+            self.ids[i] = bucket
+            self.levels[i] = {}
+            self.questions[i] = {}
+        for counts in (self.levels[i].setdefault(level, [0, 0]), self.questions[i].setdefault(qid, [0, 0])):
+            counts[0] += correct
+            counts[1] += 1
+
+    def series(self, qid: str = "") -> list[tuple[int, dict]]:
+        """Baldes da janela, do mais antigo ao mais novo: (início em epoch, {chave: [acertos, total]})."""
+        out = []
+        for bucket in range(self.newest - self.slots + 1, self.newest + 1):
+            i = bucket % self.slots
+            if bucket < 0 or self.ids[i] != bucket:
+                continue
+            data = {qid: self.questions[i][qid]} if qid and qid in self.questions[i] else ({} if qid else self.levels[i])
+            out.append((bucket * self.seconds, data))
+        return out
+
+
+class AccuracyTimeSeries(CsvTailIndex):
+    def reset(self):
+        self.rings = {name: RingBuckets(seconds, slots) for name, (seconds, slots) in SERIES_RESOLUTIONS.items()}
+
+    def add(self, row: dict):
+        if row.get("mode") == REVIEW_MODE:
+            return
+        when = datetime.strptime(row["timestamp_utc"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        epoch_seconds = int(when.timestamp())
+        correct = 1 if int(row["is_correct"]) == 1 else 0
+        for ring in self.rings.values():
+            ring.add(epoch_seconds, row.get("level", "Médio"), row.get("question_id", ""), correct)
+
+    def chart_rows(self, resolution: str, qid: str = "") -> list[dict]:
+        """Formato longo (período, série, taxa); o período é datetime para o eixo ser temporal."""
+        self.refresh()
+        with self.lock:
+            buckets = self.rings[resolution].series(qid)
+        rows = []
+        for start, data in buckets:
+            when = datetime.fromtimestamp(start, timezone.utc)
+            for key, (correct, total) in data.items():
+                if total:
+                    rows.append({"Período (UTC)": when, "Série": key, "Taxa (%)": round((correct / total) * 100, 1)})
+        return rows
+
+
+@st.cache_resource
+def get_accuracy_series() -> AccuracyTimeSeries:
+    return AccuracyTimeSeries(answers_file)
+
+
+class WrongAnswerIndex(CsvTailIndex):
+    """
+    Questões que cada aluno errou na última tentativa: (nome normalizado, versão do banco) -> ids.
+    Acertar depois tira a questão do conjunto.
+    """
+
+    def reset(self):
+        self.wrong = {}
+
+    def add(self, row: dict):
+        key = ((row.get("student_name") or "").strip().lower(), row.get("bank_version") or "")
+        wrong = self.wrong.setdefault(key, set())
+        if int(row["is_correct"]) == 1:
+            wrong.discard(row["question_id"])
+        else:
+            wrong.add(row["question_id"])
+
+    def wrong_questions(self, student_name: str, version: str) -> set[str]:
+        self.refresh()
+        with self.lock:
+            return set(self.wrong.get((student_name.strip().lower(), version), ()))
+
+
+@st.cache_resource
+def get_wrong_answer_index() -> WrongAnswerIndex:
+    return WrongAnswerIndex(answers_file)
+
+
+RECENT_ANSWER_KEYS = int(os.getenv("BOOLEAN_RECENT_ANSWER_KEYS", "50000"))
+
+
+def answer_key(student_name: str, attempt_id: str, question_id: str) -> tuple:
+    return (student_name.strip().lower(), attempt_id, question_id)
+
+
+class RecentAnswerKeys(CsvTailIndex):
+    """
+    Chaves de idempotência das respostas mais recentes (LRU limitado), alimentadas pelo log —
+    inclusive por outros processos — e reservadas em memória antes de gravar.
+    """
+
+    def reset(self):
+        self.keys = OrderedDict()
+
+    def remember(self, key: tuple):
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+        while len(self.keys) > RECENT_ANSWER_KEYS:
+            self.keys.popitem(last=False)
+
+    def add(self, row: dict):
+        if row.get("attempt_id"):
+            self.remember(answer_key(row.get("student_name", ""), row["attempt_id"], row.get("question_id", "")))
+
+    def claim(self, key: tuple) -> bool:
+        """Reserva a chave; False se ela já foi usada."""
+        self.refresh()
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.remember(key)
+            return True
+
+    def release(self, key: tuple):
+        """Desfaz a reserva de uma gravação que falhou, para o reenvio do aluno ser aceito."""
+        with self.lock:
+            self.keys.pop(key, None)
+
+
+@st.cache_resource
+def get_recent_answer_keys() -> RecentAnswerKeys:
+    return RecentAnswerKeys(answers_file)
+
+
+def report_file_sizes(metrics: MetricsRegistry):
+    for path in (scores_file(), answers_file(), progress_file(), progress_archive_file()):
+        metrics.set("boolean_data_file_bytes", file_size(path), file=path.name)
+
+
+# cada rerun redefine a função; troca a referência para não acumular callbacks
+get_metrics().gauge_callbacks[:] = [report_file_sizes]
 
 
 # =========================
@@ -699,18 +1414,187 @@ while len(QUESTIONS) < 30:
     QUESTIONS.append(clone)
 
 
+# =========================
+# BANCO DE QUESTÕES (versionado, recarregável)
+# =========================
+# Se BOOLEAN_QUESTION_BANK (padrão: questions.json) existir, ele substitui o banco embutido acima.
+# Um watcher em segundo plano valida cada nova versão e troca a atual sem reiniciar o servidor;
+# sessões em andamento continuam na versão em que começaram.
+BANK_FILE = Path(os.getenv("BOOLEAN_QUESTION_BANK", "questions.json"))
+BANK_POLL_SECONDS = float(os.getenv("BOOLEAN_BANK_POLL_SECONDS", "5"))
+LEVELS = ["Fácil", "Médio", "Difícil"]
+MAX_OPTIONS = 4  # letras A-D
+
+
+def bank_version(questions: list[dict]) -> str:
+    raw = json.dumps(questions, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:10]
+
+
+def validate_bank(questions) -> list[str]:
+    if not isinstance(questions, list) or not questions:
+        return ["O banco precisa ser uma lista não vazia de questões."]
+    errors = []
+    seen = set()
+    for i, q in enumerate(questions):
+        if not isinstance(q, dict):
+            errors.append(f"#{i}: questão não é um objeto.")
+            continue
+        qid = q.get("id")
+        if not isinstance(qid, str) or not qid:
+            errors.append(f"#{i}: 'id' ausente.")
+            qid = f"#{i}"
+        elif qid in seen:
+            errors.append(f"{qid}: id repetido.")
+        seen.add(qid)
+        if q.get("level") not in LEVELS:
+            errors.append(f"{qid}: 'level' deve ser um de {LEVELS}.")
+        if not isinstance(q.get("prompt"), str) or not q["prompt"]:
+            errors.append(f"{qid}: 'prompt' ausente.")
+        if not isinstance(q.get("code", ""), str):
+            errors.append(f"{qid}: 'code' deve ser texto.")
+        options = q.get("options")
+        if (not isinstance(options, list) or not 2 <= len(options) <= MAX_OPTIONS
+                or not all(isinstance(o, str) for o in options) or len(set(options)) != len(options)):
+            errors.append(f"{qid}: 'options' precisa ter de 2 a {MAX_OPTIONS} alternativas distintas.")
+        elif q.get("answer") not in options:
+            errors.append(f"{qid}: 'answer' não está entre as alternativas.")
+        if not isinstance(q.get("rationale", {}), dict):
+            errors.append(f"{qid}: 'rationale' deve ser um objeto.")
+    return errors
+
+
+class QuestionBankRegistry:
+    def __init__(self, builtin: list[dict]):
+        self.lock = threading.Lock()
+        self.versions = {}          # versão -> lista de questões (imutável depois de publicada)
+        self.level_positions = {}   # versão -> nível -> posições no banco (para sorteio estratificado)
+        self.current = ""
+        self.source = "embutido"
+        self.last_error = ""
+        self.file_stamp = None
+        self.publish(builtin, "embutido")
+
+    def publish(self, questions: list[dict], source: str):
+        version = bank_version(questions)
+        by_level = {}
+        for i, q in enumerate(questions):
+            by_level.setdefault(q["level"], []).append(i)
+        with self.lock:
+            self.versions.setdefault(version, questions)
+            self.level_positions.setdefault(version, by_level)
+            self.current = version
+            self.source = source
+            self.last_error = ""
+
+    def positions_by_level(self, version: str) -> dict:
+        with self.lock:
+            return self.level_positions[version]
+
+    def get(self, version: str = "") -> tuple[str, list[dict]]:
+        with self.lock:
+            if version not in self.versions:
+                version = self.current
+            return version, self.versions[version]
+
+    def check_file(self):
+        try:
+            info = BANK_FILE.stat()
+        except OSError:
+            return
+        stamp = (info.st_mtime_ns, info.st_size)
+        if stamp == self.file_stamp:
+            return
+        self.file_stamp = stamp
+        try:
+            with open(BANK_FILE, "r", encoding="utf-8") as f:
+                questions = json.load(f)
+            errors = validate_bank(questions)
+            if errors:
+                self.last_error = f"{BANK_FILE}: " + " ".join(errors[:5])
+                return
+            self.publish(questions, BANK_FILE.as_posix())
+        except Exception as e:  # arquivo malformado nunca derruba o app nem o watcher
+            self.last_error = f"{BANK_FILE}: {e}"
+
+    def watch(self):
+        while True:
+            try:
+                self.check_file()
+            except Exception as e:
+                self.last_error = f"{BANK_FILE}: {e}"
+            time.sleep(BANK_POLL_SECONDS)
+
+
+@st.cache_resource
+def get_bank_registry() -> QuestionBankRegistry:
+    registry = QuestionBankRegistry(QUESTIONS)
+    registry.check_file()
+    threading.Thread(target=registry.watch, name="question-bank-watcher", daemon=True).start()
+    return registry
+
+
+def read_quiz_quota() -> tuple[dict, list[str]]:
+    """Cota válida (níveis conhecidos, k > 0) e as entradas ignoradas, para aviso na área do administrador."""
+    try:
+        raw = [(str(level), str(k)) for level, k in st.secrets["quiz"]["quota"].items()]
+    except Exception:
+        raw = [part.partition("=")[::2] for part in os.getenv("BOOLEAN_QUIZ_QUOTA", "").split(",") if part.strip()]
+    quota, ignored = {}, []
+    for level, k in raw:
+        level, k = level.strip(), k.strip()
+        if level in LEVELS and k.isdigit() and int(k) > 0:
+            quota[level] = int(k)
+        else:
+            ignored.append(f"{level}={k}")
+    return quota, ignored
+
+
+def get_quiz_quota() -> dict:
+    """
+    Quantas questões sortear por nível, ex.: BOOLEAN_QUIZ_QUOTA="Fácil=10,Médio=10,Difícil=10"
+    (ou [quiz] quota em secrets.toml). Vazio: o quiz usa o banco inteiro.
+    """
+    return read_quiz_quota()[0]
+
+
+def session_questions() -> list[dict]:
+    """Questões da versão fixada na sessão do aluno."""
+    _, questions = get_bank_registry().get(st.session_state.get("bank_version", ""))
+    return questions
+
+
 # =========================
 # SESSION STATE
 # =========================
 def clear_fixed_option_states():
     for k in list(st.session_state.keys()):
-        if str(k).startswith("opts_Q") or str(k).startswith("radio_Q"):
+        if str(k).startswith("opts_") or str(k).startswith("radio_"):
             del st.session_state[k]
 
 
-def reset_quiz_order():
-    order = list(range(len(QUESTIONS)))
-    random.shuffle(order)
+def reset_quiz_order(seed: int = None, version: str = "", quota: dict = None):
+    """
+    Sorteia a ordem das questões a partir de uma semente: (semente, versão, cota) bastam para
+    regerar a mesma ordem ao retomar a sessão.
+    """
+    registry = get_bank_registry()
+    st.session_state.bank_version, questions = registry.get(version)
+    st.session_state.order_seed = random.getrandbits(32) if seed is None else seed
+    st.session_state.quiz_quota = get_quiz_quota() if quota is None else quota
+    rng = random.Random(st.session_state.order_seed)
+    if st.session_state.quiz_quota:
+        # O(k): sorteia direto dos índices por nível, sem embaralhar o banco inteiro
+        by_level = registry.positions_by_level(st.session_state.bank_version)
+        order = []
+        for level, k in st.session_state.quiz_quota.items():
+            positions = by_level.get(level, [])
+            order.extend(rng.sample(positions, min(k, len(positions))))
+        if not order:
+            order = list(range(len(questions)))  # cota sem questões nesta versão do banco: usa o banco inteiro
+    else:
+        order = list(range(len(questions)))
+    rng.shuffle(order)
     st.session_state.q_order = order
 
 
@@ -725,12 +1609,125 @@ def reset_quiz_progress():
     st.session_state.last_q = None
     st.session_state.last_bonus = 0
     st.session_state.saved_score = False
+    st.session_state.time_up = False
     clear_fixed_option_states()
 
 
+def new_attempt():
+    st.session_state.attempt_id = uuid.uuid4().hex[:12]
+
+
 def reset_all():
     reset_quiz_order()
     reset_quiz_progress()
+    new_attempt()
+    st.session_state.review_mode = False
+    st.session_state.exam_deadline = time.time() + EXAM_MINUTES * 60 if EXAM_MINUTES else None
+
+
+def start_review(wrong_ids: set[str]):
+    """Modo revisão: só as questões erradas, na mesma versão do banco (sem pontuação nem progresso gravados)."""
+    order = [i for i, q in enumerate(session_questions()) if q["id"] in wrong_ids]
+    random.shuffle(order)
+    reset_quiz_progress()
+    new_attempt()
+    st.session_state.q_order = order
+    st.session_state.review_mode = True
+    st.session_state.exam_deadline = None
+
+
+def exam_seconds_left():
+    """Segundos até o fim da prova cronometrada (None sem prazo)."""
+    deadline = st.session_state.get("exam_deadline")
+    return None if deadline is None else max(0.0, deadline - time.time())
+
+
+def resume_token() -> str:
+    return f"{student_hash(st.session_state.student_name)}.{st.session_state.attempt_id}"
+
+
+def set_resume_token():
+    # vai na URL: recarregar a página ou reconectar retoma a tentativa sem digitar o nome
+    token = resume_token()
+    if st.query_params.get("retomar") != token:
+        st.query_params["retomar"] = token
+
+
+def clear_resume_token():
+    if "retomar" in st.query_params:
+        del st.query_params["retomar"]
+
+
+SNAPSHOT_FIELDS = {
+    "student_name": str, "attempt_id": str, "order_seed": int, "quota": dict,
+    "q_index": int, "base_correct": int, "final_points": int, "streak": int, "max_streak": int,
+}
+
+
+def valid_snapshot(snapshot) -> bool:
+    if not isinstance(snapshot, dict):
+        return False
+    for field, kind in SNAPSHOT_FIELDS.items():
+        value = snapshot.get(field)
+        if not isinstance(value, kind) or isinstance(value, bool):
+            return False
+    deadline = snapshot.get("exam_deadline")
+    return (deadline is None or isinstance(deadline, (int, float))) and all(
+        level in LEVELS and isinstance(k, int) and k > 0 for level, k in snapshot["quota"].items()
+    )
+
+
+def resume_session(snapshot: dict) -> bool:
+    """Reidrata a sessão a partir do snapshot (O(1): um arquivo, sem reler os CSVs)."""
+    if not valid_snapshot(snapshot):
+        return False  # snapshot corrompido ou editado à mão: começa do zero
+    version, _ = get_bank_registry().get(snapshot.get("bank_version", ""))
+    if version != snapshot.get("bank_version"):
+        return False  # versão do banco não existe mais neste processo
+    st.session_state.student_name = snapshot["student_name"]
+    reset_quiz_order(snapshot["order_seed"], version, snapshot["quota"])
+    reset_quiz_progress()
+    for k in ("q_index", "base_correct", "final_points", "streak", "max_streak"):
+        st.session_state[k] = snapshot[k]
+    st.session_state.attempt_id = snapshot["attempt_id"]
+    st.session_state.exam_deadline = snapshot.get("exam_deadline")
+    st.session_state.review_mode = False
+    set_resume_token()
+    return True
+
+
+def save_progress(answered: int):
+    """Grava o andamento (e o snapshot da sessão) só quando o estado do quiz muda (início, resposta confirmada)."""
+    if st.session_state.get("review_mode"):
+        return
+    write_snapshot({
+        "student_name": st.session_state.student_name,
+        "attempt_id": st.session_state.attempt_id,
+        "bank_version": st.session_state.bank_version,
+        "order_seed": st.session_state.order_seed,
+        "quota": st.session_state.quiz_quota,
+        "q_index": answered,
+        "base_correct": st.session_state.base_correct,
+        "final_points": st.session_state.final_points,
+        "streak": st.session_state.streak,
+        "max_streak": st.session_state.max_streak,
+        "exam_deadline": st.session_state.get("exam_deadline"),
+    })
+    set_resume_token()
+    total = len(st.session_state.q_order)
+    percent_official_live = (st.session_state.base_correct / total) * 100 if total else 0.0
+    upsert_progress(
+        st.session_state.student_name,
+        answered,
+        total,
+        st.session_state.base_correct,
+        st.session_state.final_points,
+        percent_official_live,
+        st.session_state.streak,
+        st.session_state.max_streak,
+        "IN_PROGRESS",
+        deadline=st.session_state.get("exam_deadline")
+    )
 
 
 if "student_name" not in st.session_state:
@@ -741,6 +1738,11 @@ if "confirm_clear" not in st.session_state:
     st.session_state.confirm_clear = False
 if "q_order" not in st.session_state:
     reset_all()
+if not st.session_state.student_name and st.query_params.get("retomar"):
+    key, _, attempt_id = st.query_params["retomar"].partition(".")
+    snapshot = load_snapshot(key)
+    if not (snapshot and snapshot.get("attempt_id") == attempt_id and resume_session(snapshot)):
+        clear_resume_token()  # tentativa encerrada ou de outra época
 
 
 # =========================
@@ -753,6 +1755,112 @@ view = st.sidebar.radio("Ir para:", ["👤 Aluno", "🔐 Admin"], index=0)
 # ==========================================================
 # VIEW: STUDENT
 # ==========================================================
+def confirm_answer(q: dict, label_to_value: dict):
+    if exam_seconds_left() == 0:
+        st.session_state.time_up = True  # resposta depois do prazo não conta
+        return
+    choice = label_to_value[st.session_state[f"radio_{q['id']}"]]
+    correct = (choice == q["answer"])
+
+    recorded = append_answer(st.session_state.student_name, q["id"], q["level"], correct,
+                             st.session_state.bank_version, st.session_state.attempt_id,
+                             REVIEW_MODE if st.session_state.review_mode else "quiz")
+
+    if not recorded:
+        pass  # reenvio da mesma questão nesta tentativa: placar já contado
+    elif correct:
+        st.session_state.base_correct += 1
+        st.session_state.streak += 1
+        st.session_state.max_streak = max(st.session_state.max_streak, st.session_state.streak)
+        bonus = streak_bonus_points(st.session_state.streak)
+        st.session_state.final_points += 1 + bonus
+        st.session_state.last_bonus = bonus
+    else:
+        st.session_state.streak = 0
+        st.session_state.last_bonus = 0
+
+    st.session_state.last_choice = choice
+    st.session_state.last_q = q
+    st.session_state.show_feedback = True
+    if recorded:
+        save_progress(st.session_state.q_index + 1)
+
+
+def next_question(qid: str):
+    rk = f"radio_{qid}"
+    if rk in st.session_state:
+        del st.session_state[rk]
+    st.session_state.q_index += 1
+    st.session_state.show_feedback = False
+    st.session_state.last_choice = None
+    st.session_state.last_q = None
+
+
+@st.fragment(run_every=10)
+def exam_clock():
+    """Relógio da prova cronometrada: encerra o quiz no prazo mesmo sem cliques do aluno."""
+    left = exam_seconds_left()
+    if left is None:
+        return
+    if left == 0:
+        st.session_state.time_up = True
+        st.rerun()
+    st.caption(f"⏱️ Tempo restante: {int(left) // 60:02d}:{int(left) % 60:02d}")
+
+
+@st.fragment
+def quiz_panel():
+    """
+    Cabeçalho + questão + feedback. Roda como fragmento: cliques no rádio, Confirmar e Próximo
+    reexecutam só este painel (o estado muda nos callbacks, antes da reexecução, sem st.rerun extra);
+    o script inteiro só roda de novo quando o quiz termina.
+    """
+    questions = session_questions()
+    total = len(st.session_state.q_order)
+    if st.session_state.q_index >= total or st.session_state.time_up:
+        st.rerun()  # última questão respondida ou prazo esgotado: tela final fica fora do fragmento
+    percent_official_live = (st.session_state.base_correct / total) * 100 if total else 0.0
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("✅ Acertos oficiais", f"{st.session_state.base_correct}/{total}")
+    c2.metric("📈 % oficial", f"{percent_official_live:.1f}%")
+    c3.metric("🏁 Pontuação final", st.session_state.final_points)
+    c4.metric("🔥 Streak", st.session_state.streak)
+
+    qpos = st.session_state.q_order[st.session_state.q_index]
+    q = questions[qpos]
+
+    st.progress(st.session_state.q_index / total)
+    difficulty_bar(q["level"])
+
+    st.markdown(f"### {q['id']} — {q['prompt']}")
+    if q.get("code"):
+        st.code(q["code"], language="java")
+
+    disabled = st.session_state.show_feedback
+
+    options = get_fixed_options_for_question(q["id"], q["options"], q["answer"])
+    letters = ["A", "B", "C", "D"]
+    labeled = [f"{letters[i]}) {opt}" for i, opt in enumerate(options)]
+    label_to_value = {labeled[i]: options[i] for i in range(len(options))}
+
+    st.radio(
+        "Escolha a alternativa:",
+        labeled,
+        index=0,
+        disabled=disabled,
+        key=f"radio_{q['id']}"
+    )
+
+    if not st.session_state.show_feedback:
+        st.button("✅ Confirmar", on_click=confirm_answer, args=(q, label_to_value))
+    else:
+        # feedback por alternativa
+        show_alternative_feedback(st.session_state.last_q, st.session_state.last_choice)
+
+        st.button("➡️ Próximo", on_click=next_question, args=(q["id"],))
+
+
 if view == "👤 Aluno":
     st.subheader("👤 Área do aluno")
 
@@ -764,35 +1872,23 @@ if view == "👤 Aluno":
                 st.warning("⚠️ Informe um nome com pelo menos 3 caracteres.")
             else:
                 st.session_state.student_name = nome_limpo
-                reset_all()
-                total = len(QUESTIONS)
-                upsert_progress(nome_limpo, 0, total, 0, 0, 0.0, 0, 0, "IN_PROGRESS")
+                snapshot = load_snapshot(student_hash(nome_limpo))
+                if not (snapshot and resume_session(snapshot)):
+                    reset_all()
+                    save_progress(0)
                 st.rerun()
         st.info("Dica: no final você verá % oficial (somente acertos) e pontuação final (com bônus).")
     else:
-        total = len(QUESTIONS)
-        percent_official_live = (st.session_state.base_correct / total) * 100 if total else 0.0
+        total = len(st.session_state.q_order)
+        review_mode = st.session_state.get("review_mode", False)
 
         st.success(f"Aluno: **{st.session_state.student_name}**")
-        c1, c2, c3, c4 = st.columns(4)
-        c1.metric("✅ Acertos oficiais", f"{st.session_state.base_correct}/{total}")
-        c2.metric("📈 % oficial", f"{percent_official_live:.1f}%")
-        c3.metric("🏁 Pontuação final", st.session_state.final_points)
-        c4.metric("🔥 Streak", st.session_state.streak)
-
-        upsert_progress(
-            st.session_state.student_name,
-            st.session_state.q_index,
-            total,
-            st.session_state.base_correct,
-            st.session_state.final_points,
-            percent_official_live,
-            st.session_state.streak,
-            st.session_state.max_streak,
-            "FINISHED" if st.session_state.q_index >= total else "IN_PROGRESS"
-        )
-
-        if st.session_state.q_index >= total:
+        if review_mode:
+            st.caption("🧠 Modo revisão: só as questões que você errou (não conta para o ranking).")
+
+        if st.session_state.q_index >= total or st.session_state.time_up:
+            if st.session_state.time_up:
+                st.warning("⏱️ Tempo esgotado! As questões não respondidas contam como erro.")
             st.success("🎉 Quiz finalizado!")
             percent_official = (st.session_state.base_correct / total) * 100 if total else 0.0
 
@@ -800,19 +1896,20 @@ if view == "👤 Aluno":
             st.metric("🏁 Pontuação final (com bônus)", st.session_state.final_points)
             st.metric("🏆 Maior streak", st.session_state.max_streak)
 
-            if not st.session_state.saved_score:
+            if not st.session_state.saved_score and not review_mode:
                 append_score(
                     st.session_state.student_name,
                     st.session_state.base_correct,
                     st.session_state.final_points,
                     total,
-                    st.session_state.max_streak
+                    st.session_state.max_streak,
+                    st.session_state.bank_version
                 )
                 st.session_state.saved_score = True
 
-                upsert_progress(
+                archive_progress(
                     st.session_state.student_name,
-                    total, total,
+                    min(total, st.session_state.q_index + int(st.session_state.show_feedback)), total,
                     st.session_state.base_correct,
                     st.session_state.final_points,
                     percent_official,
@@ -820,81 +1917,34 @@ if view == "👤 Aluno":
                     st.session_state.max_streak,
                     "FINISHED"
                 )
+                delete_snapshot(st.session_state.student_name)
+                clear_resume_token()
 
-            col1, col2 = st.columns(2)
+            if not review_mode:
+                better = get_score_index().better_than(st.session_state.student_name, round(percent_official, 2))
+                if better is not None:
+                    st.metric("📊 Comparação com a turma", f"Melhor que {better:.0f}% da turma")
+
+            wrong_ids = get_wrong_answer_index().wrong_questions(st.session_state.student_name,
+                                                                st.session_state.bank_version)
+            col1, col2, col3 = st.columns(3)
             if col1.button("🔁 Refazer"):
                 reset_all()
+                save_progress(0)
+                st.rerun()
+            if wrong_ids and col3.button(f"🧠 Revisar erros ({len(wrong_ids)})"):
+                start_review(wrong_ids)
                 st.rerun()
             if col2.button("👤 Trocar aluno"):
                 st.session_state.student_name = ""
+                clear_resume_token()
                 reset_all()
                 st.rerun()
 
         else:
-            qpos = st.session_state.q_order[st.session_state.q_index]
-            q = QUESTIONS[qpos]
-
-            st.progress(st.session_state.q_index / total)
-            difficulty_bar(q["level"])
-
-            st.markdown(f"### {q['id']} — {q['prompt']}")
-            if q.get("code"):
-                st.code(q["code"], language="java")
-
-            disabled = st.session_state.show_feedback
-
-            options = get_fixed_options_for_question(q["id"], q["options"], q["answer"])
-            letters = ["A", "B", "C", "D"]
-            labeled = [f"{letters[i]}) {opt}" for i, opt in enumerate(options)]
-            label_to_value = {labeled[i]: options[i] for i in range(len(options))}
-
-            choice_label = st.radio(
-                "Escolha a alternativa:",
-                labeled,
-                index=0,
-                disabled=disabled,
-                key=f"radio_{q['id']}"
-            )
-            choice = label_to_value[choice_label]
-
-            if not st.session_state.show_feedback:
-                if st.button("✅ Confirmar"):
-                    correct = (choice == q["answer"])
-
-                    append_answer(st.session_state.student_name, q["id"], q["level"], correct)
-
-                    if correct:
-                        st.session_state.base_correct += 1
-                        st.session_state.streak += 1
-                        st.session_state.max_streak = max(st.session_state.max_streak, st.session_state.streak)
-                        bonus = streak_bonus_points(st.session_state.streak)
-                        st.session_state.final_points += 1 + bonus
-                        st.session_state.last_bonus = bonus
-                    else:
-                        st.session_state.streak = 0
-                        st.session_state.last_bonus = 0
-
-                    st.session_state.last_choice = choice
-                    st.session_state.last_q = q
-                    st.session_state.show_feedback = True
-                    st.rerun()
-
-            if st.session_state.show_feedback:
-                q_last = st.session_state.last_q
-                chosen_last = st.session_state.last_choice
-
-                # feedback por alternativa
-                show_alternative_feedback(q_last, chosen_last)
-
-                if st.button("➡️ Próximo"):
-                    rk = f"radio_{q['id']}"
-                    if rk in st.session_state:
-                        del st.session_state[rk]
-                    st.session_state.q_index += 1
-                    st.session_state.show_feedback = False
-                    st.session_state.last_choice = None
-                    st.session_state.last_q = None
-                    st.rerun()
+            if not review_mode and exam_seconds_left() is not None:
+                exam_clock()
+            quiz_panel()
 
 
 # ==========================================================
@@ -914,6 +1964,7 @@ else:
                 st.error("Usuário ou senha inválidos.")
         st.info("Configure em `.streamlit/secrets.toml` (recomendado).")
     else:
+        admin_render_start = time.perf_counter()
         st.success("✅ Admin autenticado.")
 
         col1, col2 = st.columns(2)
@@ -925,22 +1976,51 @@ else:
             st.session_state.confirm_clear = True
 
         if st.session_state.confirm_clear:
-            st.warning("⚠️ Apagar tudo (pontuações, progresso e respostas)?")
+            st.warning(f"⚠️ Começar do zero (pontuações, progresso e respostas)? Os dados atuais ficam guardados "
+                       f"para exportação nas últimas {EPOCH_RETENTION} épocas.")
             c1, c2 = st.columns(2)
             if c1.button("✅ Confirmar exclusão"):
                 clear_all_data()
                 st.session_state.confirm_clear = False
-                st.success("✔️ Dados apagados.")
+                st.success("✔️ Nova época iniciada.")
                 st.rerun()
             if c2.button("❌ Cancelar"):
                 st.session_state.confirm_clear = False
                 st.rerun()
 
+        c1, c2 = st.columns(2)
+        if c1.button("📦 Arquivar sessões encerradas"):
+            moved = sweep_progress_archive()
+            st.success(f"✔️ {moved} sessão(ões) movida(s) para o arquivo morto.")
+        if c2.button("🧹 Remover respostas duplicadas"):
+            removed = dedupe_answers()
+            st.success(f"✔️ {removed} resposta(s) duplicada(s) removida(s).")
+
+        bank = get_bank_registry()
+        current_version, current_questions = bank.get()
+        st.caption(f"📚 Banco de questões: versão `{current_version}` ({bank.source}, {len(current_questions)} questões)")
+        if bank.last_error:
+            st.warning(f"⚠️ Nova versão do banco rejeitada: {bank.last_error}")
+        _, ignored_quota = read_quiz_quota()
+        if ignored_quota:
+            st.warning(f"⚠️ Cota do quiz ignorada para: {', '.join(ignored_quota)} (níveis válidos: {', '.join(LEVELS)}).")
+
         rows = load_scores()
-        answers = load_answers()
+        stats_by_version = answer_level_stats()
         progress = load_progress()
 
+        # não misturar versões incompatíveis do banco nas estatísticas
+        seen_versions = sorted(({r.get("bank_version") or "" for r in rows} | set(stats_by_version)) - {""})
+        if seen_versions:
+            version_filter = st.selectbox("Versão do banco nas estatísticas:", ["Todas"] + seen_versions)
+            if version_filter != "Todas":
+                rows = [r for r in rows if r.get("bank_version") == version_filter]
+                stats_by_version = {version_filter: stats_by_version.get(version_filter, {})}
+
         st.markdown("## ⏳ Alunos em andamento")
+        get_session_expiry()
+        if IDLE_TIMEOUT_MIN:
+            st.caption(f"Sessões sem atividade há mais de {IDLE_TIMEOUT_MIN:g} min são encerradas automaticamente.")
         in_prog = [p for p in progress if p.get("status") == "IN_PROGRESS"]
         if not in_prog:
             st.info("Ninguém em andamento no momento.")
@@ -960,16 +2040,16 @@ else:
             st.dataframe(view_rows, use_container_width=True, hide_index=True)
 
         st.markdown("## 📊 Taxa de acerto por dificuldade")
-        if not answers:
+        stats = {"Fácil": {"correct": 0, "total": 0}, "Médio": {"correct": 0, "total": 0}, "Difícil": {"correct": 0, "total": 0}}
+        for level_stats in stats_by_version.values():
+            for level, counts in level_stats.items():
+                stats.setdefault(level, {"correct": 0, "total": 0})
+                stats[level]["correct"] += counts["correct"]
+                stats[level]["total"] += counts["total"]
+
+        if not any(counts["total"] for counts in stats.values()):
             st.info("Ainda não há respostas registradas por questão.")
         else:
-            stats = {"Fácil": {"correct": 0, "total": 0}, "Médio": {"correct": 0, "total": 0}, "Difícil": {"correct": 0, "total": 0}}
-            for a in answers:
-                level = a.get("level", "Médio")
-                if level not in stats:
-                    stats[level] = {"correct": 0, "total": 0}
-                stats[level]["total"] += 1
-                stats[level]["correct"] += 1 if a["is_correct"] == 1 else 0
 
             chart_data = []
             for level in ["Fácil", "Médio", "Difícil"]:
@@ -981,6 +2061,28 @@ else:
             st.bar_chart({row["Dificuldade"]: row["Taxa (%)"] for row in chart_data})
             st.dataframe(chart_data, use_container_width=True, hide_index=True)
 
+        st.markdown("## 📈 Taxa de acerto ao longo do tempo")
+        c1, c2 = st.columns(2)
+        resolution = c1.radio("Agrupar por:", list(SERIES_RESOLUTIONS), horizontal=True)
+        question_ids = [q["id"] for q in current_questions]
+        series_qid = c2.selectbox("Questão:", ["Por dificuldade"] + question_ids)
+        series_rows = get_accuracy_series().chart_rows(resolution, "" if series_qid == "Por dificuldade" else series_qid)
+        if not series_rows:
+            st.info("Sem respostas na janela recente.")
+        else:
+            # eixo temporal (não nominal): a ordem não depende do texto, só os rótulos são formatados
+            fmt = {"Minuto": "%d/%m %H:%M", "Hora": "%d/%m %Hh", "Dia": "%d/%m/%Y"}[resolution]
+            st.altair_chart(
+                alt.Chart(alt.Data(values=[{**r, "Período (UTC)": r["Período (UTC)"].isoformat()} for r in series_rows]))
+                .mark_line(point=True)
+                .encode(
+                    x=alt.X("Período (UTC):T", scale=alt.Scale(type="utc"), axis=alt.Axis(format=fmt, formatType="utc")),
+                    y=alt.Y("Taxa (%):Q", scale=alt.Scale(domain=[0, 100])),
+                    color="Série:N",
+                ),
+                use_container_width=True,
+            )
+
         st.markdown("## 🏆 Ranking (finalizados)")
         if not rows:
             st.warning("Ainda não há pontuações finalizadas (os alunos precisam concluir o quiz).")
@@ -1017,15 +2119,30 @@ else:
             st.dataframe(ranking_table, use_container_width=True, hide_index=True)
 
         st.markdown("## 📥 Exportar dados")
-        ensure_scores_file()
-        ensure_progress_file()
-        ensure_answers_file()
+        active_epoch = current_epoch()
+        epochs = list(reversed(list_epochs())) or [active_epoch]
+        if active_epoch not in epochs:
+            epochs.insert(0, active_epoch)
 
-        with open(SCORES_FILE, "rb") as f:
+        def epoch_label(e: str) -> str:
+            name = "legado (data/)" if e == LEGACY_EPOCH else e
+            return f"{name} — ativa" if e == active_epoch else name
+
+        export_epoch = st.selectbox("Época:", epochs, format_func=epoch_label)
+        for path, headers in ((scores_file(export_epoch), SCORES_HEADERS), (progress_file(export_epoch), PROGRESS_HEADERS),
+                              (answers_file(export_epoch), ANS_HEADERS), (progress_archive_file(export_epoch), PROGRESS_HEADERS)):
+            ensure_file(path, headers)
+
+        with open(scores_file(export_epoch), "rb") as f:
             st.download_button("📥 Baixar CSV de Pontuações (finalizados)", f, file_name="boolean_scores.csv", mime="text/csv")
-        with open(PROGRESS_FILE, "rb") as f:
+        with open(progress_file(export_epoch), "rb") as f:
             st.download_button("📥 Baixar CSV de Progresso (andamento)", f, file_name="boolean_progress.csv", mime="text/csv")
-        with open(ANSWERS_FILE, "rb") as f:
+        with open(progress_archive_file(export_epoch), "rb") as f:
+            st.download_button("📥 Baixar CSV de Sessões Encerradas (arquivo morto)", f, file_name="boolean_progress_archive.csv", mime="text/csv")
+        with open(answers_file(export_epoch), "rb") as f:
             st.download_button("📥 Baixar CSV de Respostas por Questão", f, file_name="boolean_answers.csv", mime="text/csv")
 
-        st.caption(f"Arquivos: `{SCORES_FILE.as_posix()}`, `{PROGRESS_FILE.as_posix()}`, `{ANSWERS_FILE.as_posix()}`")
+        st.caption(f"Arquivos: `{scores_file(export_epoch).as_posix()}`, `{progress_file(export_epoch).as_posix()}`, "
+                   f"`{answers_file(export_epoch).as_posix()}`, `{progress_archive_file(export_epoch).as_posix()}`")
+
+        get_metrics().observe("boolean_admin_render_seconds", time.perf_counter() - admin_render_start)
@@ -0,0 +1,269 @@
+"""
+Importação em lote de CSVs históricos (outros servidores/semestres).
+
+Uso:  python import_data.py arquivo1.csv arquivo2.csv ... [--chunk-rows 100000] [--max-fan-in 64] [--dry-run]
+
+O tipo de cada arquivo (pontuações, respostas ou andamento) é detectado pelo cabeçalho. As linhas são
+validadas, ordenadas por (timestamp, aluno, questão) com ordenação externa em memória limitada
+(blocos de --chunk-rows linhas em arquivos temporários + merge), deduplicadas e mescladas com o
+arquivo da época ativa, que é trocado por rename atômico. Os índices do app (percentil, série temporal,
+agregados do daemon) percebem a troca do arquivo e se reconstroem numa única passada.
+Prefira rodar fora do horário de aula: linhas gravadas durante o merge são copiadas no final,
+mas o app não espera a importação.
+"""
+import os
+import csv
+import heapq
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from storage import (
+    ANS_HEADERS, ARCHIVED_STATUSES, PROGRESS_HEADERS, REVIEW_MODE, SCORES_HEADERS, answers_file, ensure_csv,
+    file_lock, file_size, progress_archive_file, scores_file,
+)
+
+
+INT_FIELDS = {"base_correct", "final_points", "total", "max_streak", "q_index", "streak", "is_correct"}
+FLOAT_FIELDS = {"percent_official", "percent_official_live"}
+# colunas acrescentadas depois; arquivos antigos podem não ter
+OPTIONAL_FIELDS = {"bank_version", "attempt_id", "mode"}
+
+# tipo -> (arquivo da época ativa, cabeçalho)
+KINDS = {
+    "scores": (scores_file, SCORES_HEADERS),
+    "answers": (answers_file, ANS_HEADERS),
+    "progress": (progress_archive_file, PROGRESS_HEADERS),
+}
+
+
+def detect_kind(headers: list[str]):
+    present = set(headers)
+    for kind, (_, expected) in KINDS.items():
+        if set(expected) - OPTIONAL_FIELDS <= present:
+            return kind
+    return None
+
+
+def sort_key(row: dict) -> tuple:
+    return (row["timestamp_utc"], row["student_name"].strip().lower(), row.get("question_id", ""))
+
+
+def clean_row(row: dict, headers: list[str]):
+    """Linha normalizada para `headers`, ou None se for inválida."""
+    try:
+        datetime.strptime(row["timestamp_utc"], "%Y-%m-%d %H:%M:%S")
+        if not (row.get("student_name") or "").strip():
+            return None
+        out = {}
+        for h in headers:
+            value = (row.get(h) or "").strip()
+            if h in INT_FIELDS:
+                int(value)
+            elif h in FLOAT_FIELDS:
+                float(value)
+            out[h] = value
+        return out
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+class ExternalSorter:
+    """
+    Ordenação externa: acumula até `chunk_rows` linhas, ordena e grava cada bloco (run) num temporário;
+    no final, faz o merge dos runs com heapq.merge lendo uma linha por run por vez. Com mais de
+    `max_fan_in` runs, o merge é feito em passadas (grupos de até `max_fan_in` viram um run maior),
+    para nunca abrir mais arquivos do que isso ao mesmo tempo.
+    """
+
+    def __init__(self, headers: list[str], chunk_rows: int, tmp_dir: str, max_fan_in: int = 64):
+        self.headers = headers
+        self.chunk_rows = chunk_rows
+        self.tmp_dir = tmp_dir
+        self.max_fan_in = max(2, max_fan_in)
+        self.buffer = []
+        self.runs = []
+
+    def add(self, row: dict):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk_rows:
+            self.flush()
+
+    def write_run(self, rows) -> str:
+        fd, path = tempfile.mkstemp(suffix=".run.csv", dir=self.tmp_dir)
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.headers)
+            writer.writerows(rows)
+        return path
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.buffer.sort(key=sort_key)
+        self.runs.append(self.write_run(self.buffer))
+        self.buffer = []
+
+    def read_run(self, path: str):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f, fieldnames=self.headers):
+                yield row
+
+    def merge_pass(self):
+        runs = []
+        for i in range(0, len(self.runs), self.max_fan_in):
+            group = self.runs[i:i + self.max_fan_in]
+            if len(group) == 1:
+                runs.append(group[0])
+                continue
+            runs.append(self.write_run(heapq.merge(*(self.read_run(p) for p in group), key=sort_key)))
+            for path in group:
+                os.unlink(path)
+        self.runs = runs
+
+    def merged(self):
+        self.flush()
+        while len(self.runs) > self.max_fan_in:
+            self.merge_pass()
+        return heapq.merge(*(self.read_run(p) for p in self.runs), key=sort_key)
+
+
+def capped_lines(path: Path, limit: int):
+    """Linhas dos primeiros `limit` bytes do arquivo; o que for acrescentado depois não é lido."""
+    with open(path, "rb") as f:
+        while f.tell() < limit:
+            line = f.readline(limit - f.tell())
+            if not line:
+                break
+            yield line.decode("utf-8")
+
+
+def stream_rows(path: Path, headers: list[str], stats: dict, limit: int = None):
+    if limit is not None:
+        yield from clean_rows(csv.DictReader(capped_lines(path, limit)), headers, stats)
+        return
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        yield from clean_rows(csv.DictReader(f), headers, stats)
+
+
+def clean_rows(reader, headers: list[str], stats: dict):
+    for row in reader:
+        stats["read"] += 1
+        cleaned = clean_row(row, headers)
+        if cleaned is None:
+            stats["invalid"] += 1
+            continue
+        yield cleaned
+
+
+def merge_into(target: Path, headers: list[str], sources: list[Path], chunk_rows: int, dry_run: bool,
+               prepare=None, on_row=None, max_fan_in: int = 64) -> dict:
+    """
+    Mescla `sources` com o arquivo ativo `target`: ordena, remove duplicatas e troca o arquivo.
+    `prepare` ajusta cada linha importada; `on_row` recebe cada linha final (agregados na mesma passada).
+    """
+    stats = {"read": 0, "invalid": 0, "duplicates": 0, "written": 0}
+    ensure_csv(target, headers)
+    start_size = file_size(target)
+
+    with tempfile.TemporaryDirectory(prefix="boolean_import_") as tmp_dir:
+        sorter = ExternalSorter(headers, chunk_rows, tmp_dir, max_fan_in)
+        existing = {"read": 0, "invalid": 0}
+        # só até start_size: o que o app acrescentar durante o merge entra pela cópia do final, uma vez só
+        for row in stream_rows(target, headers, existing, limit=start_size):
+            sorter.add(row)
+        for source in sources:
+            for row in stream_rows(source, headers, stats):
+                sorter.add(prepare(row) if prepare else row)
+        stats["existing_invalid"] = existing["invalid"]
+
+        fd, merged_path = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=target.parent)
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=headers)
+                writer.writeheader()
+                last_key = None
+                for row in sorter.merged():
+                    key = sort_key(row)
+                    if key == last_key:
+                        stats["duplicates"] += 1
+                        continue
+                    last_key = key
+                    writer.writerow(row)
+                    stats["written"] += 1
+                    if on_row:
+                        on_row(row)
+
+            if dry_run:
+                return stats
+
+            with file_lock(target):
+                # linhas que o app acrescentou durante o merge vão para o final do arquivo novo
+                with open(target, "rb") as src, open(merged_path, "ab") as dst:
+                    src.seek(start_size)
+                    dst.write(src.read())
+                os.chmod(merged_path, 0o644)
+                os.replace(merged_path, target)
+        finally:
+            if os.path.exists(merged_path):
+                os.unlink(merged_path)
+    return stats
+
+
+def close_imported_session(row: dict) -> dict:
+    """
+    Sessões importadas vêm de outro servidor/semestre: nenhuma continua em andamento aqui.
+    As que estavam IN_PROGRESS entram no arquivo morto como ABANDONED.
+    """
+    if row["status"] not in ARCHIVED_STATUSES:
+        row["status"] = "ABANDONED"
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa e mescla CSVs históricos do Jogo de Boolean.")
+    parser.add_argument("files", nargs="+", type=Path, help="CSVs de pontuações, respostas e/ou andamento")
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="linhas por bloco da ordenação externa")
+    parser.add_argument("--max-fan-in", type=int, default=64,
+                        help="máximo de runs abertos ao mesmo tempo no merge (limite de arquivos abertos)")
+    parser.add_argument("--dry-run", action="store_true", help="valida e conta, sem alterar os arquivos ativos")
+    args = parser.parse_args()
+
+    by_kind = {kind: [] for kind in KINDS}
+    for path in args.files:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            kind = detect_kind(next(csv.reader(f), []))
+        if kind is None:
+            print(f"⚠️  {path}: cabeçalho não reconhecido, ignorado.")
+            continue
+        by_kind[kind].append(path)
+
+    level_stats = {}
+
+    def count_answer(row: dict):
+        if row["mode"] == REVIEW_MODE:
+            return
+        counts = level_stats.setdefault(row["level"], [0, 0])
+        counts[0] += int(row["is_correct"])
+        counts[1] += 1
+
+    for kind, sources in by_kind.items():
+        if not sources:
+            continue
+        target_fn, headers = KINDS[kind]
+        target = target_fn()
+        if kind == "progress":
+            # tudo vai para o arquivo morto; o andamento ativo é só deste servidor
+            stats = merge_into(target, headers, sources, args.chunk_rows, args.dry_run,
+                               prepare=close_imported_session, max_fan_in=args.max_fan_in)
+        else:
+            stats = merge_into(target, headers, sources, args.chunk_rows, args.dry_run,
+                               on_row=count_answer if kind == "answers" else None, max_fan_in=args.max_fan_in)
+        print(f"{kind}: {stats}")
+
+    for level, (correct, total) in sorted(level_stats.items()):
+        print(f"  {level}: {correct}/{total} acertos ({(correct / total) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Relatórios em lote, fora do servidor do Streamlit.
+
+Uso:  python report.py [--data-dir data] [--data-dir outro/semestre ...] [--out reports] [--workers N]
+
+Cada --data-dir é tratado como uma turma. Os CSVs de pontuações e respostas são divididos em N intervalos
+de bytes (alinhados em fim de linha); cada processo lê, converte e agrega o próprio intervalo e devolve só
+os parciais, que o processo principal junta e grava, por turma:
+ranking.csv, alunos.csv, niveis.csv, questoes.csv e relatorio.html.
+"""
+import os
+import csv
+import html
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from storage import ANSWERS_NAME, REVIEW_MODE, SCORES_NAME, epoch_dir
+
+
+LEVELS = ["Fácil", "Médio", "Difícil"]
+
+
+def student_key(name: str) -> str:
+    return (name or "").strip().lower()
+
+
+def ranking_key(r: dict) -> tuple:
+    # mesma ordem do ranking da área do administrador
+    return (r["percent_official"], r["final_points"], r["max_streak"], r["timestamp_utc"])
+
+
+def range_lines(path: Path, start: int, end: int):
+    """
+    Linhas do CSV que começam no intervalo de bytes [start, end), já com o cabeçalho do arquivo:
+    intervalos vizinhos cobrem o arquivo sem repetir nem cortar linhas.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        if start <= f.tell():
+            start = f.tell()
+        else:
+            f.seek(start - 1)
+            f.readline()  # termina a linha que pertence ao intervalo anterior
+        yield header.decode("utf-8")
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode("utf-8")
+
+
+def byte_ranges(path: Path, parts: int) -> list[tuple[int, int]]:
+    size = path.stat().st_size if path.exists() else 0
+    if not size:
+        return []
+    bounds = [size * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+
+def scan_scores(path: Path, start: int, end: int) -> dict:
+    """Parciais de um trecho do arquivo de pontuações (roda num processo do pool)."""
+    best = {}
+    attempts = {}
+    for row in csv.DictReader(range_lines(path, start, end)):
+        try:
+            row["base_correct"] = int(row.get("base_correct", 0))
+            row["final_points"] = int(row.get("final_points", 0))
+            row["total"] = int(row.get("total", 0))
+            row["percent_official"] = float(row.get("percent_official", 0.0))
+            row["max_streak"] = int(row.get("max_streak", 0))
+        except (TypeError, ValueError):
+            continue
+        key = student_key(row.get("student_name"))
+        if not key:
+            continue
+        attempts[key] = attempts.get(key, 0) + 1
+        if key not in best or ranking_key(row) > ranking_key(best[key]):
+            best[key] = row
+    return {"best": best, "attempts": attempts}
+
+
+def scan_answers(path: Path, start: int, end: int) -> dict:
+    """Parciais de um trecho do log de respostas (roda num processo do pool)."""
+    answered = {}
+    levels = {}
+    questions = {}
+    for row in csv.DictReader(range_lines(path, start, end)):
+        if row.get("mode") == REVIEW_MODE:
+            continue  # modo revisão não conta nos relatórios
+        try:
+            is_correct = int(row.get("is_correct", 0))
+        except (TypeError, ValueError):
+            continue
+        name = row.get("student_name") or ""
+        key = student_key(name)
+        if not key:
+            continue
+        counts = answered.setdefault(key, [name, 0, 0])
+        counts[1] += is_correct
+        counts[2] += 1
+        level = row.get("level", "Médio")
+        for table, k in ((levels, level), (questions, (row.get("question_id", ""), level))):
+            c = table.setdefault(k, [0, 0])
+            c[0] += is_correct
+            c[1] += 1
+    return {"answered": answered, "levels": levels, "questions": questions}
+
+
+def merge_counts(into: dict, part: dict):
+    for k, (correct, total) in part.items():
+        c = into.setdefault(k, [0, 0])
+        c[0] += correct
+        c[1] += total
+
+
+def build_class_report(data_dir: Path, workers: int, pool: ProcessPoolExecutor) -> dict:
+    """
+    Cada processo lê e converte o próprio trecho (intervalo de bytes) dos CSVs e devolve só os parciais;
+    o processo principal apenas junta os parciais.
+    """
+    futures = []
+    for scan, name in ((scan_scores, SCORES_NAME), (scan_answers, ANSWERS_NAME)):
+        path = data_dir / name
+        futures += [pool.submit(scan, path, start, end) for start, end in byte_ranges(path, workers)]
+
+    report = {"best": {}, "attempts": {}, "answered": {}, "levels": {}, "questions": {}}
+    for future in futures:
+        part = future.result()
+        # o mesmo aluno aparece em vários trechos: junta pela melhor tentativa / somando contagens
+        for key, row in part.get("best", {}).items():
+            if key not in report["best"] or ranking_key(row) > ranking_key(report["best"][key]):
+                report["best"][key] = row
+        for key, n in part.get("attempts", {}).items():
+            report["attempts"][key] = report["attempts"].get(key, 0) + n
+        for key, (name, correct, total) in part.get("answered", {}).items():
+            counts = report["answered"].setdefault(key, [name, 0, 0])
+            counts[1] += correct
+            counts[2] += total
+        merge_counts(report["levels"], part.get("levels", {}))
+        merge_counts(report["questions"], part.get("questions", {}))
+    return report
+
+
+def rate(correct: int, total: int) -> float:
+    return round((correct / total) * 100, 1) if total else 0.0
+
+
+def report_tables(report: dict) -> dict:
+    # empates em ordem de nome: a ordem de chegada dos parciais varia entre execuções
+    ranking = sorted(sorted(report["best"].values(), key=lambda r: student_key(r["student_name"])),
+                     key=ranking_key, reverse=True)
+
+    students = []
+    for key in sorted(set(report["answered"]) | set(report["best"])):
+        name, correct, total = report["answered"].get(key) or (report["best"][key]["student_name"], 0, 0)
+        students.append({
+            "aluno": name,
+            "respostas": total,
+            "acertos": correct,
+            "taxa_pct": rate(correct, total),
+            "tentativas_finalizadas": report["attempts"].get(key, 0),
+        })
+
+    levels = []
+    for level in LEVELS + sorted(set(report["levels"]) - set(LEVELS)):
+        correct, total = report["levels"].get(level, [0, 0])
+        levels.append({"nivel": level, "respostas": total, "acertos": correct, "taxa_pct": rate(correct, total)})
+
+    return {
+        "ranking": [{
+            "posicao": i,
+            "aluno": r["student_name"],
+            "acertos": f"{r['base_correct']}/{r['total']}",
+            "percent_oficial": f"{r['percent_official']:.2f}",
+            "pontos_finais": r["final_points"],
+            "max_streak": r["max_streak"],
+            "ultima_utc": r["timestamp_utc"],
+        } for i, r in enumerate(ranking, start=1)],
+        "alunos": students,
+        "niveis": levels,
+        "questoes": [{
+            "questao": qid,
+            "nivel": level,
+            "respostas": total,
+            "acertos": correct,
+            "taxa_pct": rate(correct, total),
+        } for (qid, level), (correct, total) in sorted(report["questions"].items())],
+    }
+
+
+def write_csv(path: Path, rows: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if not rows:
+            return
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def html_table(title: str, rows: list[dict]) -> str:
+    if not rows:
+        return f"<h2>{html.escape(title)}</h2><p>Sem dados.</p>"
+    head = "".join(f"<th>{html.escape(str(k))}</th>" for k in rows[0])
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in r.values()) + "</tr>" for r in rows
+    )
+    return f"<h2>{html.escape(title)}</h2><table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def write_html(path: Path, class_name: str, tables: dict):
+    sections = [
+        html_table("🏆 Ranking", tables["ranking"]),
+        html_table("📊 Taxa de acerto por dificuldade", tables["niveis"]),
+        html_table("❓ Questões", tables["questoes"]),
+        html_table("👤 Alunos", tables["alunos"]),
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<!doctype html><html><head><meta charset='utf-8'>"
+            f"<title>Jogo de Boolean — {html.escape(class_name)}</title>"
+            "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+            "td,th{border:1px solid #ccc;padding:4px 8px}</style></head><body>"
+            f"<h1>✅ Jogo de Boolean — {html.escape(class_name)}</h1>" + "".join(sections) + "</body></html>"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatórios em lote do Jogo de Boolean.")
+    parser.add_argument("--data-dir", action="append", type=Path,
+                        help="diretório de dados de uma turma (repetível; padrão: época ativa)")
+    parser.add_argument("--out", type=Path, default=Path("reports"), help="diretório de saída")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processos do pool")
+    args = parser.parse_args()
+
+    data_dirs = args.data_dir or [epoch_dir()]
+    workers = max(1, args.workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for data_dir in data_dirs:
+            class_name = data_dir.resolve().name
+            out_dir = args.out / class_name
+            out_dir.mkdir(parents=True, exist_ok=True)
+
+            tables = report_tables(build_class_report(data_dir, workers, pool))
+            for name, rows in tables.items():
+                write_csv(out_dir / f"{name}.csv", rows)
+            write_html(out_dir / "relatorio.html", class_name, tables)
+            print(f"{class_name}: {len(tables['ranking'])} alunos no ranking -> {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
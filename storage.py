@@ -0,0 +1,422 @@
+import os
+import io
+import csv
+import json
+import time
+import shutil
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, as travas viram no-op
+    fcntl = None
+
+
+# =========================
+# ARQUIVOS (CSV)
+# =========================
+DATA_DIR = Path("data")
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+# Épocas: cada limpeza de dados aponta o app para um diretório novo (data/epochs/<época>) trocando só o
+# ponteiro CURRENT_EPOCH (rename atômico, O(1)). Quem ainda escreve na época anterior termina lá, sem
+# corrida; as épocas antigas ficam para exportação até saírem pela política de retenção.
+EPOCHS_DIR = DATA_DIR / "epochs"
+CURRENT_EPOCH_FILE = DATA_DIR / "CURRENT_EPOCH"
+# mínimo 2: a ativa e a que acabou de ser trocada, onde escritas em curso ainda terminam
+MIN_EPOCH_RETENTION = 2
+EPOCH_RETENTION = max(MIN_EPOCH_RETENTION, int(os.getenv("BOOLEAN_EPOCH_RETENTION", "10")))
+LEGACY_EPOCH = ""  # arquivos direto em data/, de antes das épocas
+
+SCORES_NAME = "boolean_scores.csv"                      # finalizados
+ANSWERS_NAME = "boolean_answers.csv"                    # log por questão
+PROGRESS_NAME = "boolean_progress.csv"                  # andamento
+PROGRESS_ARCHIVE_NAME = "boolean_progress_archive.csv"  # sessões encerradas
+SESSIONS_DIR_NAME = "sessions"                          # snapshot JSON por aluno (retomada)
+
+SCORES_HEADERS = [
+    "timestamp_utc", "student_name",
+    "base_correct", "final_points",
+    "total", "percent_official", "max_streak", "bank_version"
+]
+ANS_HEADERS = [
+    "timestamp_utc", "student_name", "question_id", "level", "is_correct", "bank_version", "attempt_id", "mode"
+]
+# coluna mode: "quiz" (vazio em linhas antigas) conta nas estatísticas; "review" (modo revisão) só alimenta
+# o índice de questões erradas do próprio aluno
+REVIEW_MODE = "review"
+PROGRESS_HEADERS = [
+    "timestamp_utc", "student_name",
+    "q_index", "total",
+    "base_correct", "final_points", "percent_official_live",
+    "streak", "max_streak", "status"
+]
+# status que saem do arquivo de andamento e vão para o arquivo morto
+ARCHIVED_STATUSES = {"FINISHED", "ABANDONED"}
+
+# socket do daemon de armazenamento (storage_daemon.py); se não existir, o app escreve direto nos arquivos
+STORAGE_SOCKET = Path(os.getenv("BOOLEAN_STORAGE_SOCKET", str(DATA_DIR / "storage.sock")))
+DAEMON_TIMEOUT_SECONDS = float(os.getenv("BOOLEAN_DAEMON_TIMEOUT", "10"))
+DAEMON_WRITE_OPS = {"append", "upsert_progress", "remove_progress"}
+
+
+def current_epoch() -> str:
+    try:
+        return CURRENT_EPOCH_FILE.read_text(encoding="utf-8").strip()
+    except OSError:
+        return LEGACY_EPOCH
+
+
+def epoch_dir(epoch: str = None) -> Path:
+    epoch = current_epoch() if epoch is None else epoch
+    return DATA_DIR if epoch == LEGACY_EPOCH else EPOCHS_DIR / epoch
+
+
+def scores_file(epoch: str = None) -> Path:
+    return epoch_dir(epoch) / SCORES_NAME
+
+
+def answers_file(epoch: str = None) -> Path:
+    return epoch_dir(epoch) / ANSWERS_NAME
+
+
+def progress_file(epoch: str = None) -> Path:
+    return epoch_dir(epoch) / PROGRESS_NAME
+
+
+def progress_archive_file(epoch: str = None) -> Path:
+    return epoch_dir(epoch) / PROGRESS_ARCHIVE_NAME
+
+
+def sessions_dir(epoch: str = None) -> Path:
+    return epoch_dir(epoch) / SESSIONS_DIR_NAME
+
+
+def list_epochs() -> list[str]:
+    """Épocas existentes, da mais antiga para a mais nova (a legada primeiro, se houver arquivos)."""
+    epochs = sorted(p.name for p in EPOCHS_DIR.iterdir() if p.is_dir()) if EPOCHS_DIR.exists() else []
+    if any((DATA_DIR / name).exists() for name in (SCORES_NAME, ANSWERS_NAME, PROGRESS_NAME)):
+        epochs.insert(0, LEGACY_EPOCH)
+    return epochs
+
+
+def start_new_epoch() -> str:
+    """
+    Troca a época ativa em O(1): cria o diretório novo e substitui o ponteiro por rename atômico.
+    """
+    epoch = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")  # ordem alfabética = ordem de criação
+    (EPOCHS_DIR / epoch).mkdir(parents=True)
+    for path, headers in ((scores_file(epoch), SCORES_HEADERS), (answers_file(epoch), ANS_HEADERS),
+                          (progress_file(epoch), PROGRESS_HEADERS), (progress_archive_file(epoch), PROGRESS_HEADERS)):
+        ensure_csv(path, headers)
+    tmp = CURRENT_EPOCH_FILE.with_name(f".{CURRENT_EPOCH_FILE.name}.{epoch}.tmp")
+    tmp.write_text(epoch, encoding="utf-8")
+    os.replace(tmp, CURRENT_EPOCH_FILE)
+    return epoch
+
+
+def gc_epochs(retention: int = EPOCH_RETENTION) -> list[str]:
+    """
+    Apaga as épocas mais antigas além das `retention` mais recentes (nunca a ativa, a anterior a ela
+    nem a legada).
+    """
+    retention = max(retention, MIN_EPOCH_RETENTION)
+    active = current_epoch()
+    epochs = [e for e in list_epochs() if e != LEGACY_EPOCH]
+    removed = []
+    for epoch in epochs[:max(0, len(epochs) - retention)]:
+        if epoch != active:
+            shutil.rmtree(EPOCHS_DIR / epoch, ignore_errors=True)
+            removed.append(epoch)
+    return removed
+
+
+def file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+# =========================
+# ESCRITA SEGURA ENTRE PROCESSOS
+# =========================
+# Vários processos do Streamlit podem escrever nos mesmos CSVs:
+# - reescritas (read-modify-write) seguram a trava consultiva (.lock) exclusiva e trocam o arquivo por rename
+#   atômico;
+# - appends seguram a mesma trava compartilhada (appends não se bloqueiam entre si) e fazem um único write()
+#   com O_APPEND; assim nenhum append cai no arquivo antigo enquanto uma reescrita troca o inode.
+LOCK_TIMEOUT_SECONDS = float(os.getenv("BOOLEAN_LOCK_TIMEOUT", "5"))
+LOCK_POLL_SECONDS = 0.01
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+def lock_path(path: Path) -> Path:
+    return path.with_name(path.name + ".lock")
+
+
+def gate_path(path: Path) -> Path:
+    return path.with_name(path.name + ".gate")
+
+
+def acquire_flock(fd: int, mode: int, deadline: float, path: Path, timeout: float):
+    while True:
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"Não foi possível travar {path} em {timeout:.1f}s")
+            time.sleep(LOCK_POLL_SECONDS)
+
+
+@contextmanager
+def file_lock(path: Path, timeout: float = LOCK_TIMEOUT_SECONDS, shared: bool = False):
+    """
+    Trava sobre `path` (via arquivo .lock ao lado), esperando no máximo `timeout` segundos.
+    Exclusiva por padrão; `shared=True` é a trava dos appends. A exclusiva fecha antes a "porteira" (.gate),
+    que os appends atravessam sem parar: appends novos esperam, os em curso terminam, e um fluxo contínuo
+    de appends não deixa uma reescrita esperando para sempre.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    deadline = time.monotonic() + timeout
+    gate = os.open(gate_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    fd = None
+    try:
+        if shared:
+            acquire_flock(gate, fcntl.LOCK_SH, deadline, path, timeout)
+            fcntl.flock(gate, fcntl.LOCK_UN)
+        else:
+            acquire_flock(gate, fcntl.LOCK_EX, deadline, path, timeout)
+        fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+        acquire_flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX, deadline, path, timeout)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        if fd is not None:
+            os.close(fd)
+        os.close(gate)  # fechar solta a porteira
+
+
+# arquivos cujo cabeçalho já foi conferido neste processo
+_checked_headers = set()
+
+
+def ensure_csv(path: Path, headers: list[str]):
+    if path.exists():
+        migrate_csv_headers(path, headers)
+        return
+    try:
+        # O_EXCL: só um processo cria e escreve o cabeçalho
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        migrate_csv_headers(path, headers)
+        return
+    try:
+        os.write(fd, csv_lines([headers]))
+    finally:
+        os.close(fd)
+    _checked_headers.add((str(path), tuple(headers)))
+
+
+def read_csv_headers(path: Path) -> list[str]:
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+
+def migrate_csv_headers(path: Path, headers: list[str]):
+    """
+    Arquivos antigos sem as colunas novas: reescreve com o cabeçalho atual (colunas faltantes ficam vazias).
+    A trava exclusiva segura os appends de outros processos (trava compartilhada) até a troca do arquivo.
+    """
+    key = (str(path), tuple(headers))
+    if key in _checked_headers:
+        return
+    if read_csv_headers(path) != headers:
+        with file_lock(path):
+            if read_csv_headers(path) != headers:
+                with open(path, "r", newline="", encoding="utf-8") as f:
+                    rows = [{h: r.get(h) or "" for h in headers} for r in csv.DictReader(f)]
+                atomic_write_csv(path, headers, rows)
+    _checked_headers.add(key)
+
+
+def csv_lines(rows: list[list]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+def append_csv_rows(path: Path, rows: list[list]):
+    """
+    Acrescenta `rows` com um único write() em O_APPEND: o lote nunca se intercala com outro processo.
+    A trava compartilhada espera reescritas em curso; o arquivo só é aberto depois dela (inode atual).
+    """
+    if not rows:
+        return
+    data = csv_lines(rows)
+    with file_lock(path, shared=True):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            written = os.write(fd, data)
+            while written < len(data):  # write curto (raro em arquivo local)
+                written += os.write(fd, data[written:])
+        finally:
+            os.close(fd)
+
+
+def atomic_write_csv(path: Path, headers: list[str], rows: list[dict]):
+    """
+    Reescreve o CSV num temporário do mesmo diretório e troca por rename: leitores nunca veem arquivo pela metade.
+    Quem chama deve segurar file_lock(path) para não perder linhas de outro processo (appends inclusive).
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        os.chmod(tmp, 0o644)
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=headers)
+            writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: Path, data: dict):
+    """Mesmo esquema de atomic_write_csv (temporário + rename) para arquivos JSON pequenos."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        os.chmod(tmp, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def rewrite_append_log(path: Path, headers: list[str], transform) -> int:
+    """
+    Reescreve um log só-de-append (respostas, pontuações) aplicando `transform` às linhas atuais.
+    A trava exclusiva segura os appends até a troca do arquivo. Retorna quantas linhas saíram.
+    """
+    with file_lock(path):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        kept = transform(rows)
+        if len(kept) != len(rows):
+            atomic_write_csv(path, headers, kept)
+    return len(rows) - len(kept)
+
+
+# =========================
+# ÍNDICES INCREMENTAIS
+# =========================
+class CsvTailIndex:
+    """
+    Índice em memória alimentado pelo final do CSV: cada refresh() lê só os bytes novos desde a última leitura
+    (inclusive linhas gravadas por outros processos). Se o arquivo for trocado (rename atômico, importação,
+    nova época) ou encolher, o índice é reconstruído numa única passada.
+    """
+
+    def __init__(self, path):
+        self.path = path  # Path fixo ou função que devolve o arquivo da época ativa
+        self.lock = threading.Lock()
+        self.inode = None
+        self.offset = 0
+        self.headers = None
+        self.reset()
+
+    def reset(self):
+        pass
+
+    def add(self, row: dict):
+        raise NotImplementedError
+
+    def refresh(self):
+        with self.lock:
+            try:
+                f = open(self.path() if callable(self.path) else self.path, "rb")
+            except OSError:
+                return
+            with f:
+                info = os.fstat(f.fileno())
+                if info.st_ino != self.inode or info.st_size < self.offset:
+                    self.inode = info.st_ino
+                    self.offset = 0
+                    self.headers = None
+                    self.reset()
+                if info.st_size == self.offset:
+                    return
+                f.seek(self.offset)
+                chunk = f.read(info.st_size - self.offset)
+            end = chunk.rfind(b"\n") + 1  # só linhas completas; o resto fica para o próximo refresh
+            if not end:
+                return
+            self.offset += end
+            for values in csv.reader(chunk[:end].decode("utf-8").splitlines()):
+                if self.headers is None:
+                    self.headers = values
+                    continue
+                try:
+                    self.add(dict(zip(self.headers, values)))
+                except (ValueError, KeyError):
+                    pass
+
+
+# =========================
+# CLIENTE DO DAEMON
+# =========================
+def daemon_request(payload: dict):
+    """
+    Envia um pedido ao storage_daemon.py pelo socket Unix. Retorna a resposta ou None quando o daemon
+    não está rodando (ou recusou o pedido) — nesse caso quem chama faz o acesso direto aos arquivos.
+    Escrita enviada por inteiro mas sem resposta (timeout) continua na fila do daemon e será gravada:
+    volta {"ok": True, "unconfirmed": True} para quem chama não gravar a mesma linha de novo.
+    """
+    if not hasattr(socket, "AF_UNIX") or not STORAGE_SOCKET.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(DAEMON_TIMEOUT_SECONDS)
+            sock.connect(str(STORAGE_SOCKET))
+            # linha incompleta não é processada pelo daemon: falha até aqui pode cair no acesso direto
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            try:
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+                response = json.loads(line)
+            except (OSError, ValueError):
+                if payload.get("op") in DAEMON_WRITE_OPS:
+                    return {"ok": True, "unconfirmed": True}
+                return None
+    except OSError:
+        return None
+    if not response.get("ok"):
+        return None
+    return response
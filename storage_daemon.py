@@ -0,0 +1,220 @@
+"""
+Daemon local de armazenamento (opcional).
+
+Uso:  python storage_daemon.py [--socket data/storage.sock] [--window-ms 5]
+
+Rode no mesmo diretório do app (ou aponte BOOLEAN_STORAGE_SOCKET para o mesmo socket nos dois).
+
+Dono dos CSVs de dados quando vários workers do Streamlit rodam na mesma máquina: recebe os pedidos
+pelo socket Unix, junta as escritas de todos os workers em group commits (um write por arquivo por lote,
+uma reescrita do andamento por lote) e mantém agregados em memória para a área do administrador.
+Sem o daemon no ar, o app volta a escrever direto nos arquivos (mesmas travas de storage.py).
+"""
+import os
+import csv
+import copy
+import json
+import time
+import queue
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+
+from storage import (
+    DAEMON_WRITE_OPS, REVIEW_MODE, STORAGE_SOCKET, CsvTailIndex, append_csv_rows, atomic_write_csv, ensure_csv, file_lock,
+)
+
+
+class AnswerStatsIndex(CsvTailIndex):
+    def reset(self):
+        self.stats = {}  # versão do banco -> nível -> {"correct", "total"}
+
+    def add(self, row: dict):
+        if row.get("mode") == REVIEW_MODE:
+            return
+        level_stats = self.stats.setdefault(row.get("bank_version") or "", {})
+        counts = level_stats.setdefault(row.get("level", "Médio"), {"correct": 0, "total": 0})
+        counts["total"] += 1
+        counts["correct"] += 1 if int(row["is_correct"]) == 1 else 0
+
+
+class ProgressTable:
+    """
+    Cópia em memória do arquivo de andamento. Se outro processo reescrever o arquivo (fallback direto,
+    varredura do admin), a assinatura muda e a tabela é relida antes da próxima alteração.
+    """
+
+    def __init__(self, path: Path, headers: list[str]):
+        self.path = path
+        self.headers = headers
+        self.rows = {}          # nome normalizado -> linha (ordem de inserção preservada)
+        self.stamp = None
+
+    def file_stamp(self):
+        try:
+            info = self.path.stat()
+        except OSError:
+            return None
+        return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+    def sync(self):
+        stamp = self.file_stamp()
+        if stamp is not None and stamp == self.stamp:
+            return
+        ensure_csv(self.path, self.headers)
+        with open(self.path, "r", newline="", encoding="utf-8") as f:
+            self.rows = {(r.get("student_name") or "").strip().lower(): r for r in csv.DictReader(f)}
+        self.stamp = self.file_stamp()
+
+    def flush(self):
+        atomic_write_csv(self.path, self.headers, list(self.rows.values()))
+        self.stamp = self.file_stamp()
+
+    def active(self) -> int:
+        return sum(1 for r in self.rows.values() if r.get("status") == "IN_PROGRESS")
+
+
+class StorageDaemon:
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.pending = queue.Queue()
+        self.progress_tables = {}
+        self.answer_stats = {}
+        self.stats_lock = threading.Lock()
+
+    # ---------- group commit ----------
+    def submit(self, request: dict) -> dict:
+        done = threading.Event()
+        item = {"request": request, "done": done, "response": None}
+        self.pending.put(item)
+        done.wait()
+        return item["response"]
+
+    def commit_loop(self):
+        while True:
+            batch = [self.pending.get()]
+            # janela curta para outros workers entrarem no mesmo commit
+            time.sleep(self.window_seconds)
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            self.commit(batch)
+
+    def commit(self, batch: list[dict]):
+        appends = {}        # path -> (headers, linhas, itens)
+        progress = {}       # path -> itens
+        for item in batch:
+            req = item["request"]
+            if req["op"] == "append":
+                headers, rows, items = appends.setdefault(req["path"], (req["headers"], [], []))
+                rows.extend(req["rows"])
+                items.append(item)
+            else:
+                progress.setdefault(req["path"], []).append(item)
+
+        for path, (headers, rows, items) in appends.items():
+            self.run(items, self.commit_appends, Path(path), headers, rows)
+        for path, items in progress.items():
+            self.run(items, self.commit_progress, Path(path), items)
+
+    def run(self, items: list[dict], fn, *args):
+        try:
+            result = fn(*args) or {}
+            response = {"ok": True, **result}
+        except Exception as e:  # o worker cai no acesso direto
+            response = {"ok": False, "error": str(e)}
+        for item in items:
+            item["response"] = item["response"] or response
+            item["done"].set()
+
+    def commit_appends(self, path: Path, headers: list[str], rows: list[list]):
+        ensure_csv(path, headers)
+        append_csv_rows(path, rows)
+
+    def commit_progress(self, path: Path, items: list[dict]):
+        table = self.progress_tables.get(path)
+        if table is None:
+            table = self.progress_tables[path] = ProgressTable(path, items[0]["request"]["headers"])
+        with file_lock(path):
+            table.sync()
+            changed = False
+            for item in items:
+                req = item["request"]
+                key = (req.get("student_name") or req.get("row", {}).get("student_name") or "").strip().lower()
+                if req["op"] == "upsert_progress":
+                    table.rows[key] = req["row"]
+                    changed = True
+                elif table.rows.pop(key, None) is not None:
+                    changed = True
+            if changed:
+                table.flush()
+        return {"active": table.active()}
+
+    # ---------- leituras ----------
+    def read_answer_stats(self, path: str) -> dict:
+        with self.stats_lock:
+            index = self.answer_stats.get(path)
+            if index is None:
+                index = self.answer_stats[path] = AnswerStatsIndex(Path(path))
+        index.refresh()
+        with index.lock:
+            return {"stats": copy.deepcopy(index.stats)}
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op in DAEMON_WRITE_OPS:
+            return self.submit(request)
+        if op == "answer_stats":
+            return {"ok": True, **self.read_answer_stats(request["path"])}
+        if op == "ping":
+            return {"ok": True}
+        return {"ok": False, "error": f"operação desconhecida: {op}"}
+
+
+def make_handler(daemon: StorageDaemon):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    response = daemon.handle(json.loads(line))
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+    return Handler
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # uma sala inteira conectando ao mesmo tempo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon local de armazenamento do Jogo de Boolean.")
+    parser.add_argument("--socket", default=str(STORAGE_SOCKET), help="caminho do socket Unix")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="janela do group commit em milissegundos")
+    args = parser.parse_args()
+
+    sock_path = Path(args.socket)
+    if sock_path.exists():
+        sock_path.unlink()  # socket órfão de uma execução anterior
+
+    daemon = StorageDaemon(args.window_ms / 1000)
+    threading.Thread(target=daemon.commit_loop, name="group-commit", daemon=True).start()
+
+    server = Server(str(sock_path), make_handler(daemon))
+    print(f"storage daemon ouvindo em {sock_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if sock_path.exists():
+            os.unlink(sock_path)
+
+
+if __name__ == "__main__":
+    main()
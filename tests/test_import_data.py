@@ -0,0 +1,56 @@
+"""
+Importação (import_data.py) com o app escrevendo ao mesmo tempo: linhas acrescentadas durante o merge
+aparecem exatamente uma vez no arquivo final.
+"""
+import csv
+import importlib
+from collections import Counter
+
+import pytest
+
+
+@pytest.fixture
+def import_data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # storage cria data/ no diretório atual
+    return importlib.import_module("import_data")
+
+
+def answer(ts, name, qid):
+    return [ts, name, qid, "Fácil", 1, "v1", "a1", "quiz"]
+
+
+def test_rows_appended_during_merge_are_kept_once(import_data, tmp_path, monkeypatch):
+    from storage import ANS_HEADERS, append_csv_rows, answers_file, ensure_csv
+
+    target = answers_file()
+    ensure_csv(target, ANS_HEADERS)
+    append_csv_rows(target, [answer(f"2024-01-01 10:00:{i:02d}", "Ana", f"q{i}") for i in range(20)])
+
+    source = tmp_path / "historico.csv"
+    with open(source, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ANS_HEADERS)
+        writer.writerows(answer(f"2023-06-01 09:00:{i:02d}", "Bia", f"q{i}") for i in range(20))
+
+    live = [answer("2024-02-01 08:00:00", "Caio", "q1"), answer("2024-02-01 08:00:05", "Caio", "q2")]
+    stream_rows = import_data.stream_rows
+
+    def appending_stream_rows(path, headers, stats, limit=None):
+        for i, row in enumerate(stream_rows(path, headers, stats, limit)):
+            if path == target and i == 5:
+                append_csv_rows(target, [live[0]])  # no meio da leitura do arquivo ativo
+            yield row
+        if path == source:
+            append_csv_rows(target, [live[1]])  # depois da leitura, antes da troca
+
+    monkeypatch.setattr(import_data, "stream_rows", appending_stream_rows)
+    stats = import_data.merge_into(target, ANS_HEADERS, [source], chunk_rows=7, dry_run=False)
+
+    with open(target, "r", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    counts = Counter((r["timestamp_utc"], r["student_name"], r["question_id"]) for r in rows)
+    assert stats["written"] == 40
+    assert len(rows) == 42
+    assert all(n == 1 for n in counts.values())
+    assert counts[("2024-02-01 08:00:00", "Caio", "q1")] == 1
+    assert counts[("2024-02-01 08:00:05", "Caio", "q2")] == 1
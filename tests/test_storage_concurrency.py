@@ -0,0 +1,130 @@
+"""
+Estresse das escritas entre processos (storage.py): nenhum append, upsert ou reescrita pode perder linhas
+quando N processos escrevem no mesmo arquivo ao mesmo tempo.
+"""
+import csv
+import importlib
+import multiprocessing
+import sys
+import time
+
+import pytest
+
+if sys.platform == "win32":
+    pytest.skip("travas via fcntl.flock", allow_module_level=True)
+
+PROCESSES = 6
+ROWS_PER_PROCESS = 2000
+HEADERS = ["writer", "seq"]
+
+fork = multiprocessing.get_context("fork")
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # storage cria data/ no diretório atual
+    return importlib.import_module("storage")
+
+
+def read_rows(path):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def run_all(targets, background=()):
+    """Roda `targets` até o fim; os processos de `background` repetem até receber o sinal de parada."""
+    stop = fork.Event()
+    procs = [fork.Process(target=fn, args=args) for fn, args in targets]
+    loops = [fork.Process(target=fn, args=args + (stop,)) for fn, args in background]
+    for p in loops:
+        p.start()
+    time.sleep(0.1)  # processos de fundo já rodando quando os demais começam
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=120)
+    stop.set()
+    for p in loops:
+        p.join(timeout=120)
+    assert all(p.exitcode == 0 for p in procs + loops)
+
+
+def appender(path, writer):
+    from storage import append_csv_rows
+    for seq in range(ROWS_PER_PROCESS):
+        append_csv_rows(path, [[writer, seq]])
+
+
+def appender_loop(path, writer, written, stop):
+    from storage import append_csv_rows
+    seq = 0
+    while not stop.is_set() and seq < 5 * ROWS_PER_PROCESS:
+        append_csv_rows(path, [[writer, seq]])
+        seq += 1
+    written[writer] = seq
+
+
+def rewriter(path, stop):
+    from storage import append_csv_rows, rewrite_append_log
+    while not stop.is_set():
+        append_csv_rows(path, [["marker", 0]])
+        rewrite_append_log(path, HEADERS, lambda rows: [r for r in rows if r["writer"] != "marker"])
+        time.sleep(0.005)
+
+
+def upserter(path, writer):
+    from storage import atomic_write_csv, file_lock
+    for seq in range(ROWS_PER_PROCESS // 10):
+        with file_lock(path, timeout=60):
+            rows = {r["writer"]: r for r in read_rows(path)}
+            rows[str(writer)] = {"writer": str(writer), "seq": str(seq)}
+            rows["total"] = {"writer": "total", "seq": str(int(rows.get("total", {"seq": "0"})["seq"]) + 1)}
+            atomic_write_csv(path, HEADERS, list(rows.values()))
+
+
+def migrator(path):
+    from storage import migrate_csv_headers
+    time.sleep(0.2)  # com os appends já em andamento
+    migrate_csv_headers(path, HEADERS + ["extra"])
+
+
+def assert_all_appended(rows):
+    seen = [(r["writer"], r["seq"]) for r in rows if r["writer"] != "marker"]
+    expected = {(str(w), str(s)) for w in range(PROCESSES) for s in range(ROWS_PER_PROCESS)}
+    assert len(seen) == len(expected)
+    assert set(seen) == expected
+
+
+def test_appends_survive_concurrent_rewrites(storage, tmp_path):
+    path = tmp_path / "log.csv"
+    storage.ensure_csv(path, HEADERS)
+    run_all([(appender, (path, w)) for w in range(PROCESSES)], background=[(rewriter, (path,))])
+    assert_all_appended(read_rows(path))
+
+
+def test_locked_upserts_lose_no_updates(storage, tmp_path):
+    path = tmp_path / "progress.csv"
+    storage.ensure_csv(path, HEADERS)
+    log = tmp_path / "log.csv"
+    storage.ensure_csv(log, HEADERS)
+    run_all([(upserter, (path, w)) for w in range(PROCESSES)] + [(appender, (log, w)) for w in range(PROCESSES)],
+            background=[(rewriter, (log,))])
+
+    rows = {r["writer"]: r for r in read_rows(path)}
+    assert rows.pop("total")["seq"] == str(PROCESSES * (ROWS_PER_PROCESS // 10))
+    assert {w: r["seq"] for w, r in rows.items()} == {str(w): str(ROWS_PER_PROCESS // 10 - 1) for w in range(PROCESSES)}
+    assert_all_appended(read_rows(log))
+
+
+def test_header_migration_keeps_concurrent_appends(storage, tmp_path):
+    path = tmp_path / "log.csv"
+    storage.ensure_csv(path, HEADERS)
+    storage.append_csv_rows(path, [["old", i] for i in range(100000)])  # migração demora o bastante
+    written = fork.Array("i", PROCESSES)
+    run_all([(migrator, (path,))], background=[(appender_loop, (path, w, written)) for w in range(PROCESSES)])
+
+    assert storage.read_csv_headers(path) == HEADERS + ["extra"]
+    seen = [(r["writer"], r["seq"]) for r in read_rows(path) if r["writer"] != "old"]
+    expected = {(str(w), str(s)) for w in range(PROCESSES) for s in range(written[w])}
+    assert len(seen) == len(expected)
+    assert set(seen) == expected